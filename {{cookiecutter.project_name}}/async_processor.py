@@ -0,0 +1,311 @@
+"""
+AsyncBatchProcessor - 基于asyncio的批处理器
+
+适用于业务逻辑以大量并发外部请求为主的场景: fetch_external_data / process_business_logic
+可以写成 async def，多个批次在同一个事件循环中同时处理，所有请求共用一个全局并发上限，
+不需要为每个请求占用一个线程。
+
+- 所有SQLite读写都在一个专用线程中执行，不会阻塞事件循环
+- 同步调用 run() / process_batches() 时，如果当前线程已有运行中的事件循环(如Jupyter)，
+  会在独立线程中启动新的事件循环；导入数据(含交互提示)仍在调用线程中同步完成
+- 也可以在Jupyter中直接 await processor.aprocess_batches()
+
+示例:
+    class MyProcessor(AsyncBatchProcessor):
+        async def enrich(self, session, order_id):
+            async with session.get(f'https://api/orders/{order_id}') as resp:
+                return await resp.json()
+
+        async def process_business_logic(self, batch_data):
+            async with aiohttp.ClientSession() as session:
+                results = await self.gather(self.enrich(session, i) for i in batch_data['order_id'])
+            batch_data['result1'] = [r['status'] for r in results]
+            return batch_data
+
+    processor = MyProcessor(max_concurrency=500, max_inflight_batches=8)
+    processor.run()
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Iterable, List, Optional
+
+import pandas as pd
+
+from batch_processor import BatchProcessor
+
+
+def _run_sync(coro: Awaitable):
+    """
+    同步执行协程: 当前线程没有运行中的事件循环时直接运行，
+    否则(如Jupyter)在独立线程的新事件循环中运行并等待结果
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        loop_running = False
+    else:
+        loop_running = True
+    if not loop_running:
+        return asyncio.run(coro)
+
+    outcome = {}
+
+    def runner():
+        try:
+            outcome['result'] = asyncio.run(coro)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=runner, name='async-batch-processor')
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+class AsyncBatchProcessor(BatchProcessor):
+    """
+    异步批处理器
+
+    fetch_external_data / process_business_logic 可以是普通方法或 async def；普通方法在默认线程池中执行，
+    不会阻塞事件循环，但其中不能使用 self.gather / self.limited；
+    fetch_external_data 的结果通过 batch_data.attrs['external_data'] 传给 process_business_logic。
+    同时处理的批次数由 max_inflight_batches 控制，单个请求的并发通过 self.gather / self.limited
+    受 max_concurrency 的全局信号量限制。
+    """
+
+    def __init__(self, *args, max_concurrency: int = 100, **kwargs):
+        """
+        Args:
+            max_concurrency: 全局并发上限，所有批次中经 self.gather / self.limited 发起的请求共用
+            其余参数同 BatchProcessor；max_inflight_batches 默认为4，engine 只支持 'sequential'；
+            adaptive_batch_size 需要同时设置 max_inflight_batches=1；
+            重写了 fetch_external_data 时 fetch_format 只支持 'dataframe'(外部数据通过 attrs 传递)
+        """
+        kwargs.setdefault('max_inflight_batches', 4)
+        super().__init__(*args, **kwargs)
+        if self.engine != 'sequential':
+            raise ValueError("AsyncBatchProcessor 自行调度批次，不支持 engine='pipeline'")
+        if self.business_logic_workers:
+            raise ValueError("AsyncBatchProcessor 在事件循环中执行业务逻辑，不支持 business_logic_workers")
+        if self.fetch_format != 'dataframe' and self._overrides_fetch_external_data():
+            raise ValueError("外部数据通过 batch_data.attrs['external_data'] 传递，"
+                             f"fetch_format='{self.fetch_format}' 的批次无法携带，请使用 fetch_format='dataframe'")
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    def _connect(self, check_same_thread: bool = False):
+        """
+        连接允许跨线程使用: 导入在调用线程中进行，处理期间只在数据库线程中访问，
+        事件循环所在的线程(如Jupyter中的独立线程)也可能不是创建连接的线程
+        """
+        return super()._connect(check_same_thread=check_same_thread)
+
+    async def limited(self, aw: Awaitable) -> Any:
+        """在全局并发上限内等待一个请求"""
+        async with self._semaphore:
+            return await aw
+
+    async def gather(self, aws: Iterable[Awaitable], return_exceptions: bool = False) -> List[Any]:
+        """并发执行一组请求，同时进行的请求数受 max_concurrency 限制，结果顺序与输入一致"""
+        return await asyncio.gather(*(self.limited(aw) for aw in aws), return_exceptions=return_exceptions)
+
+    def process_batches(self, debug_batch_times: Optional[int] = None) -> int:
+        """同步入口，见 aprocess_batches；在Jupyter中调用时会在独立线程中运行事件循环"""
+        return _run_sync(self.aprocess_batches(debug_batch_times))
+
+    def process_batches_sharded(self, workers: int, debug_batch_times: Optional[int] = None) -> int:
+        raise ValueError("AsyncBatchProcessor 在单个事件循环中并发处理，不支持 run(workers=N) 分片处理")
+
+    async def aprocess_batches(self, debug_batch_times: Optional[int] = None) -> int:
+        """
+        在事件循环中批量处理数据
+
+        按顺序读取批次，最多 max_inflight_batches 个批次同时处理，按完成先后回填；
+        开启 retry_sweeps 时主流程结束后按退避时间进行重试。
+
+        Args:
+            debug_batch_times: 调试模式下只处理指定数量的批次，None表示处理所有数据
+
+        Returns:
+            处理的总记录数
+        """
+        if debug_batch_times:
+            self.logger.info(f"开始异步批量处理 (调试模式: 限制{debug_batch_times}个批次)...")
+        else:
+            self.logger.info("开始异步批量处理...")
+
+        loop = asyncio.get_running_loop()
+        db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-sqlite')
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.run_metrics = {'batch_size_history': []} if self.adaptive_batch_size else {}
+
+        def on_db(func, *args):
+            return loop.run_in_executor(db_executor, func, *args)
+
+        try:
+            await on_db(self._prepare_async_pass)
+            total_processed, batch_count = await self._arun_pass(on_db, debug_batch_times)
+            if self.retry_sweeps and not debug_batch_times:
+                total_processed += await self._arun_retry_sweeps(on_db)
+        finally:
+            db_executor.shutdown(wait=True)
+
+        if debug_batch_times:
+            self.logger.info(f"调试批量处理完成，处理了{batch_count}个批次，总共{total_processed}条记录")
+        else:
+            self.logger.info(f"批量处理完成，总共处理{total_processed}条记录")
+        if self.adaptive_batch_size:
+            sizes = [entry['batch_size'] for entry in self.run_metrics['batch_size_history']]
+            if sizes:
+                self.logger.info(f"自适应批次大小: {min(sizes)}~{max(sizes)}，当前为{self.batch_size}")
+        return total_processed
+
+    def _prepare_async_pass(self):
+        if self.claim_mode:
+            self._ensure_claim_columns()
+        if self.retry_sweeps:
+            self._ensure_retry_column()
+        self._check_pending_index_usage()
+        self._column_dtypes = None
+
+    async def _arun_pass(self, on_db, debug_batch_times: Optional[int] = None) -> tuple:
+        """
+        把待处理记录处理一遍: 批次读取在数据库线程中进行，处理中的批次不足 max_inflight_batches 时补读
+
+        Returns:
+            (处理的记录数, 批次数)
+        """
+        total_processed = 0
+        batch_count = 0
+        position = self._start_position()
+        exhausted = False
+        inflight = set()
+        try:
+            while True:
+                while not exhausted and len(inflight) < self.max_inflight_batches and not (
+                        debug_batch_times and batch_count >= debug_batch_times):
+                    batch_df = await on_db(self._fetch_batch, position)
+                    if batch_df.empty:
+                        exhausted = True
+                        break
+                    position = self._batch_position(batch_df)
+                    batch_count += 1
+                    inflight.add(asyncio.ensure_future(self._aprocess_single_batch(batch_df, on_db)))
+
+                if not inflight:
+                    break
+
+                done, inflight = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    total_processed += task.result()
+                self.logger.info(f"已处理{total_processed}条数据，处理中{len(inflight)}个批次")
+        finally:
+            for task in inflight:
+                task.cancel()
+            if inflight:
+                await asyncio.gather(*inflight, return_exceptions=True)
+
+        return total_processed, batch_count
+
+    async def _aprocess_single_batch(self, batch_df: pd.DataFrame, on_db) -> int:
+        """
+        处理单个批次并回填，整批失败时记录错误(开启 retry_sweeps 时安排重试)，返回回填的记录数
+
+        开启 adaptive_batch_size(此时 max_inflight_batches 为1)时按本批耗时和失败记录数调整后续批次的大小
+        """
+        started = time.perf_counter()
+        failed_rows = len(batch_df)
+        try:
+            try:
+                external_data = await self._acall(self.fetch_external_data, batch_df)
+                batch_df.attrs['external_data'] = external_data
+                updates = await self._abuild_updates(batch_df)
+            except Exception as e:
+                self.logger.error(f"处理批次时发生错误: {str(e)}", exc_info=e)
+                if self.retry_sweeps:
+                    await on_db(self._schedule_batch_retry, batch_df)
+                return 0
+
+            if updates:
+                await on_db(self._batch_update, updates)
+            failed_rows = sum(1 for update in updates if not update[0])
+            return len(updates)
+        finally:
+            if self.adaptive_batch_size and self._retry_due_at is None:
+                self._adapt_batch_size(len(batch_df), time.perf_counter() - started, failed_rows)
+
+    @staticmethod
+    async def _acall(func, *args) -> Any:
+        """
+        调用可能是 async def 的钩子方法: 协程函数直接在事件循环中等待，
+        普通方法放到默认线程池中执行，避免阻塞事件循环和其他处理中的批次
+        """
+        if inspect.iscoroutinefunction(func):
+            return await func(*args)
+        result = await asyncio.to_thread(func, *args)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _abuild_updates(self, batch_df: pd.DataFrame) -> List[List]:
+        """异步版本的 _build_updates: 开启 bisect_failures 时整批失败后二分定位失败记录"""
+        try:
+            result = await self._acall(self.process_business_logic, self._to_fetch_format(batch_df))
+            return self._updates_from_result(batch_df, result)
+        except Exception as e:
+            if not self.bisect_failures or len(batch_df) == 1:
+                raise
+            error = e
+
+        self.logger.warning(f"{len(batch_df)}条记录的批次处理失败({error})，拆分为两半重新处理")
+
+        async def build_half(half: pd.DataFrame) -> List[List]:
+            try:
+                return await self._abuild_updates(half)
+            except Exception as e:
+                cursor_id = half[self.cursor_field].iloc[0]
+                self.logger.error(f"游标ID {cursor_id} 单独处理仍失败，按处理失败记录: {str(e)}", exc_info=e)
+                return self._failed_updates(half)
+
+        # 两半同时重新处理
+        middle = len(batch_df) // 2
+        results = await asyncio.gather(build_half(batch_df.iloc[:middle]), build_half(batch_df.iloc[middle:]))
+        return results[0] + results[1]
+
+    async def _arun_retry_sweeps(self, on_db) -> int:
+        """异步版本的 _run_retry_sweeps: 等待使用 asyncio.sleep，不阻塞事件循环"""
+        total_processed = 0
+        batch_size = self.batch_size
+        try:
+            for sweep in range(1, self.retry_sweeps + 1):
+                pending, _, sweep_deadline = await on_db(self._pending_retry_summary)
+                if not pending:
+                    break
+                self.batch_size = self._sweep_batch_size(sweep, batch_size)
+                self.logger.info(f"开始第{sweep}轮重试，共{pending}条记录待重试，批次大小{self.batch_size}")
+
+                while True:
+                    pending, due_at, _ = await on_db(self._pending_retry_summary, sweep_deadline)
+                    if not pending:
+                        break
+                    wait = due_at - time.time()
+                    if wait > 0:
+                        self.logger.info(f"第{sweep}轮重试: 等待{wait:.1f}秒后重试{pending}条记录中已到期的部分")
+                        await asyncio.sleep(wait)
+
+                    self._retry_due_at = time.time()
+                    try:
+                        processed, _ = await self._arun_pass(on_db)
+                    finally:
+                        self._retry_due_at = None
+                    total_processed += processed
+        finally:
+            self.batch_size = batch_size
+
+        return total_processed
@@ -4,17 +4,209 @@ BatchProcessor - 批量数据处理框架
 提供标准化的数据导入、批处理、结果回填流程模板
 """
 
+import numpy as np
 import pandas as pd
 import sqlite3
 import json
+import os
+import pickle
+import socket
+import functools
+import glob
+import importlib
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Union
-from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Any, Optional, Union, Iterator
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from cachetools import cached, LRUCache
 import logging
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import queue
+import random
+import threading
+import time
 from datetime import datetime
 
 
+# define_schema 中 field_types 支持的字段类型: 类型名 -> (SQLite列类型, 非空字段的默认值)
+FIELD_TYPES = {
+    'int': ('INTEGER', 0),
+    'float': ('REAL', 0.0),
+    'float32': ('REAL', 0.0),
+    'bool': ('INTEGER', 0),
+    'str': ('TEXT', ''),
+    'category': ('TEXT', ''),
+    'datetime': ('TEXT', ''),
+    'bytes': ('BLOB', b''),
+}
+
+
+# 流水线引擎的阶段: 阶段名 -> 日志中的名称；读取和回填固定单线程，中间两个阶段的并发数可配置
+PIPELINE_STAGES = {
+    'read': '读取',
+    'fetch_external_data': '外部数据',
+    'process_business_logic': '业务逻辑',
+    'write': '回填',
+}
+
+
+# 压缩格式识别: 扩展名 / 文件头魔数 -> pandas compression 参数
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+
+def _detect_compression(path: str) -> tuple:
+    """
+    识别文件的压缩格式
+
+    Returns:
+        (去掉压缩扩展名后的路径, 压缩格式)，未压缩时压缩格式为None
+    """
+    for ext, compression in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(ext):
+            return path[:-len(ext)], compression
+
+    with open(path, 'rb') as f:
+        header = f.read(6)
+    for magic, compression in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return path, compression
+    return path, None
+
+
+def _mp_context():
+    """
+    子进程启动方式: 优先使用fork，使notebook中定义的处理器子类可以直接在子进程中使用
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _run_shard(processor: 'BatchProcessor', shard_index: int, lower: int, upper: Optional[int],
+               write_queue, debug_batch_times: Optional[int] = None):
+    """
+    分片子进程入口: 使用独立连接和游标处理 (lower, upper] 区间内的待处理数据
+
+    回填结果不直接写库，而是通过 write_queue 发回主进程统一写入。
+    """
+    processor.conn = processor._connect()
+    processor._write_queue = write_queue
+    processor._shard_index = shard_index
+    processor._cursor_range = (lower, upper)
+    try:
+        count = processor.process_batches(debug_batch_times)
+        write_queue.put(('done', shard_index, count))
+    except Exception as e:
+        write_queue.put(('error', shard_index, f"{type(e).__name__}: {e}"))
+    finally:
+        processor.conn.close()
+
+
+def _import_pyarrow(module_name: str):
+    """按需导入pyarrow模块，未安装时给出安装提示"""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise ImportError(f"该功能需要安装 pyarrow: pip install pyarrow ({e})") from e
+
+
+def _frame_to_shared_memory(df: pd.DataFrame) -> tuple:
+    """
+    将DataFrame按Arrow IPC流格式写入新建的共享内存块
+
+    先计算序列化后的长度再直接写入共享内存，不产生中间副本。
+    Arrow无法编码的DataFrame(如结果字段中数字与空字符串混合的object列)改用pickle写入，
+    读取时按数据头区分两种格式。
+
+    Returns:
+        (共享内存块, 数据长度)；用完后由读取方 close / unlink
+    """
+    pa = _import_pyarrow('pyarrow')
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        data = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        shm.buf[:len(data)] = data
+        return shm, len(data)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    # 写完后释放对共享内存的引用，否则无法 close
+    buffer_writer = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+    with pa.ipc.new_stream(buffer_writer, table.schema) as writer:
+        writer.write_table(table)
+    buffer_writer.close()
+    del writer, buffer_writer
+    return shm, size
+
+
+def _frame_from_shared_memory(shm: shared_memory.SharedMemory, size: int) -> pd.DataFrame:
+    """
+    从共享内存块读取 _frame_to_shared_memory 写入的DataFrame
+
+    IPC数据整体复制一次到进程内再解码(数值列解码不再复制)，返回的DataFrame不引用共享内存，之后可以关闭共享内存。
+    """
+    pa = _import_pyarrow('pyarrow')
+    view = shm.buf[:size]
+    try:
+        data = view.tobytes()
+    finally:
+        view.release()
+    # Arrow IPC流以 0xFFFFFFFF 开头，pickle 以协议标记 0x80 开头
+    if data[:1] == b'\x80':
+        return pickle.loads(data)
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+
+# 业务逻辑子进程中的处理器，由进程池的 initializer 设置
+_logic_worker_processor = None
+
+
+def _init_logic_worker(processor: 'BatchProcessor'):
+    global _logic_worker_processor
+    _logic_worker_processor = processor
+
+
+def _run_logic_worker(shm_name: str, size: int) -> tuple:
+    """
+    业务逻辑子进程入口: 从共享内存读取批次，执行 process_business_logic，
+    把结果字段(附带行在批次中的位置)写入新的共享内存块，返回 (共享内存名, 数据长度)
+    """
+    processor = _logic_worker_processor
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        batch_df = _frame_from_shared_memory(shm, size)
+    finally:
+        shm.close()
+
+    result = processor._from_fetch_format(
+        processor.process_business_logic(processor._to_fetch_format(batch_df)), batch_df
+    )
+    result_fields = [f for f in processor.define_schema().get('result_fields', []) if f in result.columns]
+    # 不属于本批次的结果行位置为-1，直接丢弃(与进程内处理时一致)，否则会被当作批次最后一行
+    positions = batch_df.index.get_indexer(result.index)
+    stray = positions == -1
+    if stray.any():
+        processor.logger.warning(f"业务逻辑返回了{int(stray.sum())}行不属于本批次的结果，已忽略")
+    result_df = result.loc[~stray, result_fields].reset_index(drop=True)
+    result_df['__position'] = positions[~stray]
+
+    result_shm, result_size = _frame_to_shared_memory(result_df)
+    result_shm.close()
+    return result_shm.name, result_size
+
+
 class BatchProcessor(ABC):
     """
     批量数据处理抽象基类
@@ -32,7 +224,34 @@ class BatchProcessor(ABC):
                  cursor_field: str = '_id',
                  status_field: str = 'is_processed',
                  retry_field: str = 'retry_count',
-                 max_retries: int = 3):
+                 max_retries: int = 3,
+                 import_chunksize: Optional[int] = None,
+                 import_engine: str = 'to_sql',
+                 hash_field: str = '_row_hash',
+                 reset_changed_rows: bool = False,
+                 import_workers: int = 1,
+                 csv_engine: str = 'pandas',
+                 prefetch_batches: int = 0,
+                 fetch_format: str = 'dataframe',
+                 claim_mode: bool = False,
+                 worker_id: Optional[str] = None,
+                 lease_seconds: float = 300,
+                 claimed_by_field: str = 'claimed_by',
+                 lease_field: str = 'lease_expires_at',
+                 retry_sweeps: int = 0,
+                 retry_backoff_base: float = 1.0,
+                 retry_backoff_max: float = 60.0,
+                 next_attempt_field: str = 'next_attempt_at',
+                 engine: str = 'sequential',
+                 stage_concurrency: Optional[Dict[str, int]] = None,
+                 stage_queue_size: int = 2,
+                 max_inflight_batches: int = 1,
+                 business_logic_workers: int = 0,
+                 bisect_failures: bool = False,
+                 adaptive_batch_size: bool = False,
+                 target_batch_seconds: float = 10.0,
+                 min_batch_size: Optional[int] = None,
+                 max_batch_size: Optional[int] = None):
         """
         初始化批处理器
 
@@ -44,7 +263,82 @@ class BatchProcessor(ABC):
             status_field: 处理状态字段名
             retry_field: 重试次数字段名
             max_retries: 最大重试次数
+            import_chunksize: 流式导入时每块读取的行数，None表示一次性读取全部数据。
+                大文件建议设置(如100000)，导入峰值内存只与单块大小相关
+            import_engine: 导入写入方式
+                - 'to_sql': 使用 DataFrame.to_sql 写入(默认)
+                - 'bulk': 显式建表 + executemany 批量插入，导入期间关闭日志与同步，适合千万级数据
+            hash_field: 行内容哈希字段名，声明 business_key 后用于增量导入的变更检测
+            reset_changed_rows: 增量导入时，内容发生变化的已有记录是否重置为待处理
+            import_workers: 数据源为多个文件时，并行解析文件的进程数（写入SQLite始终在主进程）
+            csv_engine: CSV解析方式
+                - 'pandas': pandas默认解析器(默认)
+                - 'pyarrow': 基于内存映射的Arrow多线程解析，按记录批次写入SQLite(需要安装pyarrow)。
+                  设置 import_chunksize 时同样每块 import_chunksize 行，列类型逐块推断
+            prefetch_batches: 后台预取的批次数，大于0时由独立线程(独立数据库连接)提前读取后续批次，
+                与当前批次的业务处理重叠执行；0表示不预取
+            fetch_format: process_business_logic 接收的批次数据格式
+                - 'dataframe': pandas DataFrame(默认)
+                - 'records': 字典列表，每行一个字典
+                - 'arrow': pyarrow RecordBatch(需要安装pyarrow)
+                外部数据只能通过 DataFrame.attrs 传递，'records' / 'arrow' 不能与 engine='pipeline'
+                及重写了 fetch_external_data 同时使用
+            claim_mode: 租约认领模式，多个进程可同时处理同一个数据库中的同一张表，
+                每个进程原子地认领一批记录，互不重复
+            worker_id: 认领模式下的工作进程标识，默认 主机名-进程号
+            lease_seconds: 认领租约时长(秒)，超时未回填的记录可被其他进程重新认领；
+                处理失败的记录也要等租约到期后才会被重新认领
+            claimed_by_field: 认领者字段名
+            lease_field: 租约到期时间字段名(Unix时间戳)
+            retry_sweeps: 主流程结束后对失败记录的重试轮数，0表示本次运行内不重试(默认)。
+                大于0时失败记录按指数退避(加随机抖动)安排下次尝试时间，到期后在本次运行内重新处理。
+                多条记录的批次整批失败时不增加重试次数，重试轮次中批次逐轮缩小，最后一轮逐条处理
+            retry_backoff_base: 第一次失败后的退避时间(秒)，之后每次失败翻倍
+            retry_backoff_max: 退避时间上限(秒)
+            next_attempt_field: 下次尝试时间字段名(Unix时间戳)
+            engine: 批次处理方式
+                - 'sequential': 逐批读取、处理、回填(默认)
+                - 'pipeline': 读取 → fetch_external_data → process_business_logic → 回填 四个阶段
+                  由有界队列连接并同时运行，外部数据通过 batch_data.attrs['external_data'] 传给业务逻辑
+            stage_concurrency: 流水线引擎中各阶段的线程数，
+                如 {'fetch_external_data': 4, 'process_business_logic': 2}，未指定的阶段为1
+            stage_queue_size: 流水线引擎中相邻阶段之间最多缓存的批次数
+            max_inflight_batches: 同时处理的批次数，大于1时连续的多个批次交给线程池同时执行业务逻辑，
+                按完成先后回填；适合业务逻辑以API等待为主的场景，不必为了吞吐调大 batch_size
+            business_logic_workers: 大于0时 process_business_logic 在该数量的子进程中执行，适合解析、
+                正则打分等CPU密集的业务逻辑。批次和结果字段以Arrow IPC格式经共享内存传递(需要安装pyarrow)，
+                由主进程合并后回填；结果字段需为Arrow可表示的类型(同一列类型一致)
+            bisect_failures: 业务逻辑整批失败时，把批次拆成两半分别重新处理，失败的一半继续拆分，
+                直到定位出单独处理仍失败的记录；其余记录正常回填，只有这些记录的重试次数加1
+            adaptive_batch_size: 根据每批的耗时和失败情况在批次之间自动调整 batch_size(见 _adapt_batch_size)，
+                batch_size 作为初始值；只支持逐批处理(engine='sequential' 且不设置 max_inflight_batches / business_logic_workers)
+            target_batch_seconds: 自适应批次大小的目标单批耗时(秒)
+            min_batch_size: 自适应批次大小的下限，默认 batch_size 的1/10
+            max_batch_size: 自适应批次大小的上限，默认 batch_size 的10倍
         """
+        if import_engine not in ('to_sql', 'bulk'):
+            raise ValueError(f"不支持的导入方式: {import_engine}")
+        if csv_engine not in ('pandas', 'pyarrow'):
+            raise ValueError(f"不支持的CSV解析方式: {csv_engine}")
+        if fetch_format not in ('dataframe', 'records', 'arrow'):
+            raise ValueError(f"不支持的批次数据格式: {fetch_format}")
+        if engine not in ('sequential', 'pipeline'):
+            raise ValueError(f"不支持的处理方式: {engine}")
+        unknown_stages = set(stage_concurrency or {}) - {'fetch_external_data', 'process_business_logic'}
+        if unknown_stages:
+            raise ValueError(f"只能设置 fetch_external_data / process_business_logic 阶段的线程数: {unknown_stages}")
+        if max_inflight_batches > 1 and engine == 'pipeline':
+            raise ValueError("流水线引擎通过 stage_concurrency 设置并发，不能与 max_inflight_batches 同时使用")
+        if business_logic_workers and engine == 'pipeline':
+            raise ValueError("流水线引擎中的业务逻辑在线程中执行，不能与 business_logic_workers 同时使用")
+        if adaptive_batch_size and (engine != 'sequential' or max_inflight_batches > 1 or business_logic_workers):
+            raise ValueError("自适应批次大小按单个批次的耗时调整，只支持逐批处理")
+        if retry_sweeps and claim_mode:
+            raise ValueError("认领模式下失败记录在租约到期后重新认领，不能与 retry_sweeps 同时使用")
+        if engine == 'pipeline' and fetch_format != 'dataframe' and self._overrides_fetch_external_data():
+            raise ValueError("外部数据通过 batch_data.attrs['external_data'] 传递，"
+                             f"fetch_format='{fetch_format}' 的批次无法携带，流水线引擎中请使用 fetch_format='dataframe'")
+
         self.batch_size = batch_size
         self.table_name = table_name
         self.db_name = db_name
@@ -52,13 +346,70 @@ class BatchProcessor(ABC):
         self.status_field = status_field
         self.retry_field = retry_field
         self.max_retries = max_retries
+        self.import_chunksize = import_chunksize
+        self.import_engine = import_engine
+        self.hash_field = hash_field
+        self.reset_changed_rows = reset_changed_rows
+        self.import_workers = import_workers
+        self.csv_engine = csv_engine
+        self.prefetch_batches = prefetch_batches
+        self.fetch_format = fetch_format
+        self.claim_mode = claim_mode
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.claimed_by_field = claimed_by_field
+        self.lease_field = lease_field
+        self.retry_sweeps = retry_sweeps
+        self.retry_backoff_base = retry_backoff_base
+        self.retry_backoff_max = retry_backoff_max
+        self.next_attempt_field = next_attempt_field
+        self.engine = engine
+        self.stage_concurrency = stage_concurrency or {}
+        self.stage_queue_size = stage_queue_size
+        self.max_inflight_batches = max_inflight_batches
+        self.business_logic_workers = business_logic_workers
+        self.bisect_failures = bisect_failures
+        self.adaptive_batch_size = adaptive_batch_size
+        self.target_batch_seconds = target_batch_seconds
+        self.min_batch_size = min_batch_size or max(1, batch_size // 10)
+        self.max_batch_size = max_batch_size or batch_size * 10
+        # 自适应批次大小每次增加的记录数
+        self._batch_size_step = max(1, batch_size // 10)
+
+        # 批次查询结果各列的numpy类型，按表结构缓存，每次开始处理时重新读取
+        self._column_dtypes = None
+
+        # 分片处理状态: 本进程处理的游标区间 (lower, upper]，子进程的回填队列，各分片的游标区间
+        self._cursor_range = (0, None)
+        self._write_queue = None
+        self._shard_index = None
+        self._shard_ranges = []
+
+        # 重试轮次中只读取下次尝试时间不晚于该时刻的记录，None表示主流程(不过滤)
+        self._retry_due_at = None
+
+        # 流水线引擎最近一遍处理的各阶段统计: 阶段名 -> {workers, batches, busy_seconds, utilization}
+        self.stage_metrics = {}
+
+        # 最近一次 process_batches 的运行统计；开启 adaptive_batch_size 时 batch_size_history 记录每批的大小和耗时
+        self.run_metrics = {}
 
         # 初始化数据库连接
-        self.conn = sqlite3.connect(self.db_name)
+        self.conn = self._connect()
 
         # 设置日志
         self._setup_logging()
 
+    def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        """创建新的数据库连接，等待锁的超时时间放宽以便多个连接并发读写"""
+        return sqlite3.connect(self.db_name, timeout=30, check_same_thread=check_same_thread)
+
+    def __getstate__(self):
+        """序列化时(如传给子进程)不携带数据库连接，子进程需要时自行重新连接"""
+        state = self.__dict__.copy()
+        state['conn'] = None
+        return state
+
     def _setup_logging(self):
         """设置日志配置"""
         logging.basicConfig(
@@ -68,12 +419,17 @@ class BatchProcessor(ABC):
         self.logger = logging.getLogger(__name__)
 
     @abstractmethod
-    def get_data_source(self) -> Union[str, pd.DataFrame]:
+    def get_data_source(self) -> Union[str, List[str], pd.DataFrame]:
         """
         获取数据源
 
         Returns:
-            数据源路径(CSV文件路径)或DataFrame对象
+            数据源路径、通配符(如 'orders-*.csv')、文件路径列表或DataFrame对象。
+            多个文件按文件名排序后依次导入，游标ID按文件顺序连续分配。
+            支持的文件格式:
+            - CSV(制表符分隔): .csv
+            - Excel: .xlsx
+            - 列式格式(需要安装pyarrow): .parquet / .feather / .arrow / .ipc
         """
         pass
 
@@ -86,11 +442,36 @@ class BatchProcessor(ABC):
             字段定义字典，格式:
             {
                 'control_fields': ['is_processed', 'retry_count', ...],
-                'result_fields': ['result1', 'result2', ...]
+                'result_fields': ['result1', 'result2', ...],
+                # 可选: 只从数据源加载这些列，未设置时加载全部列
+                'source_fields': ['order_id', 'user_id', ...],
+                # 可选: 业务逻辑需要读取的列，每批只查询这些列和控制字段，未设置时查询全部列
+                'input_fields': ['order_id', 'user_id'],
+                # 可选: 业务主键(字段名或字段列表)，声明后支持增量导入
+                'business_key': ['order_id'],
+                # 可选: 优先级字段(数值，越大越先处理，空值按0导入)，声明后按 (优先级, 游标) 顺序处理
+                'priority_field': 'vip_level',
+                # 可选: 输入字段和结果字段的类型，类型名或 {'type': ..., 'nullable': ...}
+                # 支持: int / float / float32 / bool / str / category / datetime / bytes
+                'field_types': {
+                    'user_id': 'int',
+                    'city': 'category',
+                    'total_amount': {'type': 'float', 'nullable': False},
+                },
+                # 可选: 使用 SQLite STRICT 表严格校验列类型(需要SQLite 3.37+)
+                'strict': False
             }
+
+            未声明类型的结果字段按文本存储，初始值为空字符串；
+            声明了类型的结果字段初始值为NULL(不可空时为该类型的默认值)
         """
         pass
 
+    @classmethod
+    def _overrides_fetch_external_data(cls) -> bool:
+        """子类是否重写了 fetch_external_data"""
+        return cls.fetch_external_data is not BatchProcessor.fetch_external_data
+
     def fetch_external_data(self, batch_data: pd.DataFrame) -> Dict[str, Any]:
         """
         获取外部数据(如API调用) - 示例方法，可选实现
@@ -104,18 +485,20 @@ class BatchProcessor(ABC):
         Returns:
             外部数据字典
 
+        engine='pipeline' 时框架会在独立的阶段中调用此方法，结果放在
+        batch_data.attrs['external_data'] 中交给 process_business_logic，不必再自行调用。
+
         示例:
-            # 缓存应该用在具体的API调用方法上，而不是这个方法
-            @cached(LRUCache(maxsize=1000))
-            def _fetch_api_data(self, query_param_tuple):
-                # 将查询参数转换为元组以支持缓存
-                query_list = list(query_param_tuple)
-                # 实现具体的API调用逻辑
+            # 按单个查询参数缓存: 每批只有未命中缓存的参数才会发给批量API
+            # (按整个参数元组缓存只有完全相同的批次才能命中)
+            api_cache = KeyedBatchCache(maxsize=100000, ttl=3600)  # from utils import KeyedBatchCache
+
+            def _fetch_api_data(self, query_list):
+                # 实现具体的批量API调用逻辑，返回 {查询参数: 结果}
                 return api_response_data
 
             def fetch_external_data(self, batch_data: pd.DataFrame):
-                query_params = batch_data['some_field'].unique().tolist()
-                return self._fetch_api_data(tuple(query_params))
+                return api_cache.get_many(batch_data['some_field'], self._fetch_api_data)
         """
         return {}
 
@@ -126,10 +509,12 @@ class BatchProcessor(ABC):
 
         Args:
             batch_data: 当前批次的数据DataFrame
+                (fetch_format='records' 时为字典列表，'arrow' 时为 pyarrow RecordBatch)
 
         Returns:
-            处理后的DataFrame，必须包含:
-            - 原始数据的所有列
+            与输入同格式的处理结果(DataFrame / 同顺序的字典列表 / RecordBatch或Table)。
+            DataFrame必须包含:
+            - 原始数据的所有列(声明了 input_fields 时只包含这些列和控制字段)
             - 结果字段的值
             - 保持原有的行顺序和索引
 
@@ -162,12 +547,13 @@ class BatchProcessor(ABC):
         """
         pass
 
-    def import_data(self, force_reimport: bool = False) -> int:
+    def import_data(self, force_reimport: bool = False, incremental: bool = False) -> int:
         """
         导入数据到SQLite，支持断点续传
 
         Args:
             force_reimport: 是否强制重新导入数据（覆盖已存在的表）
+            incremental: 表已存在时直接执行增量导入（需要声明 business_key），不再询问
 
         Returns:
             导入的数据行数
@@ -175,7 +561,11 @@ class BatchProcessor(ABC):
         # 检查表是否已存在
         existing_count = self._check_existing_data()
 
+        if existing_count > 0 and incremental and not force_reimport:
+            return self._do_delta_import()
+
         if existing_count > 0 and not force_reimport:
+            has_business_key = bool(self._get_business_key())
             self.logger.info(f"发现已存在的数据表 '{self.table_name}'，包含 {existing_count} 条记录")
 
             # 在Jupyter环境中询问用户选择
@@ -189,15 +579,22 @@ class BatchProcessor(ABC):
                     <ul style='margin: 10px 0;'>
                         <li><strong>跳过导入</strong>: 直接使用现有数据，继续处理未完成的记录（推荐用于失败重试）</li>
                         <li><strong>覆盖导入</strong>: 删除现有数据，重新导入全部数据（全新开始）</li>
+                        {'<li><strong>增量导入</strong>: 只追加新数据、更新有变化的数据，保留已处理结果</li>' if has_business_key else ''}
                     </ul>
                 </div>
                 """))
 
-                choice = input("请选择: [s]跳过导入 / [r]覆盖导入 (默认: s): ").lower().strip()
+                prompt = "请选择: [s]跳过导入 / [r]覆盖导入"
+                if has_business_key:
+                    prompt += " / [a]增量导入"
+                choice = input(f"{prompt} (默认: s): ").lower().strip()
 
                 if choice in ['r', 'replace', '覆盖', 'reimport']:
                     self.logger.info("用户选择覆盖导入，将重新导入所有数据")
                     return self._do_import_data(force_replace=True)
+                elif has_business_key and choice in ['a', 'append', '增量']:
+                    self.logger.info("用户选择增量导入，将追加新数据并保留已处理结果")
+                    return self._do_delta_import()
                 else:
                     # 确保现有表包含游标字段（默认 _id）
                     self._ensure_cursor_column_in_table()
@@ -210,12 +607,17 @@ class BatchProcessor(ABC):
                 print("选择操作:")
                 print("  [s] 跳过导入 - 直接使用现有数据，继续处理未完成的记录（推荐用于失败重试）")
                 print("  [r] 覆盖导入 - 删除现有数据，重新导入全部数据（全新开始）")
+                if has_business_key:
+                    print("  [a] 增量导入 - 只追加新数据、更新有变化的数据，保留已处理结果")
 
-                choice = input("请选择 [s/r] (默认: s): ").lower().strip()
+                choice = input(f"请选择 [{'s/r/a' if has_business_key else 's/r'}] (默认: s): ").lower().strip()
 
                 if choice in ['r', 'replace', '覆盖']:
                     self.logger.info("用户选择覆盖导入，将重新导入所有数据")
                     return self._do_import_data(force_replace=True)
+                elif has_business_key and choice in ['a', 'append', '增量']:
+                    self.logger.info("用户选择增量导入，将追加新数据并保留已处理结果")
+                    return self._do_delta_import()
                 else:
                     # 确保现有表包含游标字段（默认 _id）
                     self._ensure_cursor_column_in_table()
@@ -239,7 +641,7 @@ class BatchProcessor(ABC):
     def _ensure_cursor_column_in_table(self):
         """
         确保现有表中存在游标字段（默认 _id）。当用户跳过导入时调用。
-        若缺失则基于 SQLite 的 rowid 生成并创建索引。
+        若缺失则基于 SQLite 的 rowid 生成并创建索引；同时确保待处理记录的部分索引存在。
         """
         if not self.cursor_field:
             return
@@ -254,36 +656,677 @@ class BatchProcessor(ABC):
                     f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_{self.cursor_field} ON {self.table_name}({self.cursor_field})"
                 )
                 self.conn.commit()
+            self._ensure_pending_index()
         except sqlite3.OperationalError:
             # 表不存在等情况
             pass
 
+    def _pending_condition(self) -> str:
+        """
+        待处理记录的过滤条件
+
+        部分索引和所有查询共用同一条件文本（max_retries以字面量写入），
+        SQLite只有在查询条件包含索引条件时才会使用部分索引。
+        """
+        return f"{self.status_field} = 0 AND {self.retry_field} < {self.max_retries}"
+
+    def _pending_index_name(self) -> str:
+        priority_field = self._get_priority_field()
+        suffix = f"_{priority_field}" if priority_field else ""
+        return f"idx_{self.table_name}_pending_r{self.max_retries}{suffix}"
+
+    def _pending_order(self) -> str:
+        """待处理记录的处理顺序，即部分索引的列: 游标；声明了优先级字段时为 (优先级降序, 游标)"""
+        priority_field = self._get_priority_field()
+        if priority_field:
+            return f"{priority_field} DESC, {self.cursor_field}"
+        return self.cursor_field
+
+    def _get_priority_field(self) -> Optional[str]:
+        return self.define_schema().get('priority_field')
+
+    def _fill_priority(self, df: pd.DataFrame):
+        """优先级字段的空值按0导入，保证 (优先级, 游标) 分页条件对每条记录都成立"""
+        priority_field = self._get_priority_field()
+        if priority_field and priority_field in df.columns:
+            df[priority_field] = df[priority_field].fillna(0)
+
+    def _ensure_pending_index(self):
+        """
+        为待处理且可重试的记录按处理顺序(见 _pending_order)创建部分索引
+
+        索引只包含待处理记录，处理完成的记录会随回填自动移出索引，
+        因此即使绝大部分数据已处理，查找下一批的开销也保持不变。
+        max_retries 或优先级字段变化后旧索引不再可用，一并删除。
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name LIKE ?",
+            (self.table_name, f"idx_{self.table_name}_pending_r%")
+        )
+        for (name,) in cur.fetchall():
+            if name != self._pending_index_name():
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+        cur.execute(
+            f"CREATE INDEX IF NOT EXISTS {self._pending_index_name()} ON {self.table_name}({self._pending_order()}) "
+            f"WHERE {self._pending_condition()}"
+        )
+        self.conn.commit()
+
+    def _check_pending_index_usage(self):
+        """通过 EXPLAIN QUERY PLAN 确认批次查询使用了待处理记录的部分索引，未使用时给出警告"""
+        try:
+            cur = self.conn.cursor()
+            cur.execute(f"EXPLAIN QUERY PLAN {self._next_batch_query()}", self._next_batch_params(self._start_position()))
+            plan = ' '.join(str(row[-1]) for row in cur.fetchall())
+        except sqlite3.OperationalError:
+            return
+        if self._pending_index_name() not in plan:
+            self.logger.warning(f"批次查询未使用待处理记录索引 {self._pending_index_name()}，查询计划: {plan}")
+
     def _do_import_data(self, force_replace: bool = False) -> int:
-        """执行实际的数据导入操作"""
-        self.logger.info("开始导入数据...")
+        """
+        执行实际的数据导入操作
 
-        # 获取数据源
-        data_source = self.get_data_source()
+        数据按块读取、补充控制字段和结果字段后逐块写入SQLite，
+        每块单独提交事务，游标字段在块之间保持连续。
+        数据先写入临时的导入表，全部写完后才替换原数据表；导入中途出错时删除导入表，
+        原数据表保持不变，不会留下只导入了一部分的数据表。
+        """
+        self.logger.info(f"开始导入数据 (写入方式: {self.import_engine})...")
 
-        if isinstance(data_source, str):
-            # 从文件读取
-            if data_source.endswith('.csv'):
-                df = pd.read_csv(data_source, sep='\t')
-            elif data_source.endswith('.xlsx'):
-                df = pd.read_excel(data_source)
+        schema = self.define_schema()
+        start_time = time.perf_counter()
+        row_count = 0
+        table_created = False
+        import_table = f"{self.table_name}__importing"
+
+        if self.import_engine == 'bulk':
+            self._apply_import_pragmas()
+
+        try:
+            # 清理上次异常退出时残留的导入表
+            self.conn.execute(f"DROP TABLE IF EXISTS {import_table}")
+            try:
+                for chunk in self._iter_source_chunks():
+                    df = self._prepare_import_chunk(chunk, schema, start_id=row_count + 1)
+
+                    # 第一块创建导入表，后续块追加；每块一个事务
+                    # 声明了字段类型时显式建表，保证列类型与schema一致
+                    if not table_created and (self.import_engine == 'bulk' or self._has_typed_schema()):
+                        self._create_table(df, table_name=import_table)
+                        table_created = True
+
+                    if self.import_engine == 'bulk':
+                        self._bulk_insert(df, table_name=import_table)
+                    else:
+                        if_exists_action = 'append' if table_created else 'replace'
+                        df.to_sql(import_table, self.conn, if_exists=if_exists_action, index=False)
+                    self.conn.commit()
+                    table_created = True
+
+                    row_count += len(df)
+                    elapsed = time.perf_counter() - start_time
+                    if self.import_chunksize:
+                        self.logger.info(f"已导入{row_count}条记录 ({row_count / max(elapsed, 1e-9):.0f} 行/秒)")
+            except BaseException:
+                self.conn.rollback()
+                self.conn.execute(f"DROP TABLE IF EXISTS {import_table}")
+                self.conn.commit()
+                self.logger.error(f"导入中途失败，已删除未完成的导入数据，数据表 '{self.table_name}' 保持不变")
+                raise
+
+            if table_created:
+                # 全部写入成功后替换原数据表
+                cur = self.conn.cursor()
+                cur.execute(f"DROP TABLE IF EXISTS {self.table_name}")
+                cur.execute(f"ALTER TABLE {import_table} RENAME TO {self.table_name}")
+                self.conn.commit()
+
+            # 导入后为游标列创建索引以提升查询性能（数据写完后一次性建索引比逐行维护更快）
+            try:
+                cur = self.conn.cursor()
+                cur.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_{self.cursor_field} ON {self.table_name}({self.cursor_field})"
+                )
+                self.conn.commit()
+                self._ensure_pending_index()
+            except sqlite3.OperationalError:
+                pass
+
+            if table_created and self._get_business_key():
+                self._ensure_business_key_index()
+        finally:
+            if self.import_engine == 'bulk':
+                self._restore_safe_pragmas()
+
+        elapsed = time.perf_counter() - start_time
+        self.logger.info(f"数据导入完成，共{row_count}条记录，耗时{elapsed:.2f}秒 ({row_count / max(elapsed, 1e-9):.0f} 行/秒)")
+        return row_count
+
+    def _apply_import_pragmas(self, cache_size_mb: int = 512):
+        """导入期间使用的高速写入配置：关闭回滚日志和同步，扩大页缓存"""
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA journal_mode = OFF")
+        cur.execute("PRAGMA synchronous = OFF")
+        cur.execute(f"PRAGMA cache_size = -{cache_size_mb * 1024}")
+        cur.execute("PRAGMA temp_store = MEMORY")
+
+    def _restore_safe_pragmas(self):
+        """导入结束后恢复安全的默认配置，保证后续处理阶段的数据一致性"""
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA journal_mode = DELETE")
+        cur.execute("PRAGMA synchronous = FULL")
+        cur.execute("PRAGMA cache_size = -2000")
+        cur.execute("PRAGMA temp_store = DEFAULT")
+
+    @staticmethod
+    def _sqlite_type(dtype) -> str:
+        """将pandas列类型映射为SQLite列类型"""
+        if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+            return 'INTEGER'
+        if pd.api.types.is_float_dtype(dtype):
+            return 'REAL'
+        return 'TEXT'
+
+    def _create_table(self, df: pd.DataFrame, table_name: Optional[str] = None, temp: bool = False):
+        """按 field_types 声明(未声明时按DataFrame列类型)显式创建数据表（已存在则先删除）"""
+        table_name = table_name or self.table_name
+        field_types = self._get_field_types()
+
+        columns = []
+        for col, dtype in df.dtypes.items():
+            if col in field_types:
+                type_name, nullable = field_types[col]
+                columns.append(f'"{col}" {FIELD_TYPES[type_name][0]}{"" if nullable else " NOT NULL"}')
             else:
-                raise ValueError(f"不支持的文件格式: {data_source}")
+                columns.append(f'"{col}" {self._sqlite_type(dtype)}')
+
+        strict = ' STRICT' if self.define_schema().get('strict') else ''
+        cur = self.conn.cursor()
+        cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+        cur.execute(f"CREATE {'TEMP ' if temp else ''}TABLE {table_name} ({', '.join(columns)}){strict}")
+
+    def _get_field_types(self) -> Dict[str, tuple]:
+        """解析 define_schema 中的 field_types，返回 {字段名: (类型名, 是否可空)}"""
+        field_types = {}
+        for field, spec in (self.define_schema().get('field_types') or {}).items():
+            if isinstance(spec, str):
+                spec = {'type': spec}
+            type_name = spec.get('type')
+            if type_name not in FIELD_TYPES:
+                raise ValueError(f"字段 {field} 的类型 {type_name} 不受支持，可选: {list(FIELD_TYPES)}")
+            field_types[field] = (type_name, spec.get('nullable', True))
+        return field_types
+
+    def _has_typed_schema(self) -> bool:
+        """是否声明了字段类型或STRICT表"""
+        schema = self.define_schema()
+        return bool(schema.get('field_types') or schema.get('strict'))
+
+    def _empty_result_value(self, field: str, field_types: Dict[str, tuple]):
+        """结果字段的空值: 未声明类型为空字符串，可空类型为NULL，不可空类型为该类型默认值"""
+        if field not in field_types:
+            return ''
+        type_name, nullable = field_types[field]
+        return None if nullable else FIELD_TYPES[type_name][1]
+
+    def _downcast_inputs(self, df: pd.DataFrame, field_types: Dict[str, tuple]) -> pd.DataFrame:
+        """按声明的类型压缩输入列: 整数降到最小位宽，float32，低基数文本转为category"""
+        for field, (type_name, _) in field_types.items():
+            if field not in df.columns:
+                continue
+            if type_name == 'int':
+                df[field] = pd.to_numeric(df[field], downcast='integer')
+            elif type_name == 'float':
+                df[field] = pd.to_numeric(df[field]).astype('float64')
+            elif type_name == 'float32':
+                df[field] = pd.to_numeric(df[field]).astype('float32')
+            elif type_name == 'bool':
+                df[field] = df[field].astype('boolean')
+            elif type_name == 'category':
+                df[field] = df[field].astype('category')
+            elif type_name == 'datetime':
+                df[field] = pd.to_datetime(df[field])
+        return df
+
+    def _apply_field_types(self, df: pd.DataFrame) -> pd.DataFrame:
+        """将从SQLite读出的数据转换为声明的pandas类型（用于导出）"""
+        pandas_dtypes = {
+            'int': 'Int64', 'float': 'float64', 'float32': 'float32',
+            'bool': 'boolean', 'str': 'string', 'category': 'category',
+        }
+        for field, (type_name, _) in self._get_field_types().items():
+            if field not in df.columns:
+                continue
+            if type_name == 'datetime':
+                df[field] = pd.to_datetime(df[field])
+            elif type_name in pandas_dtypes:
+                df[field] = df[field].astype(pandas_dtypes[type_name])
+        return df
+
+    def _bulk_insert(self, df: pd.DataFrame, table_name: Optional[str] = None):
+        """使用 executemany 将一块数据插入数据表，不自动提交"""
+        # 按列转换为Python原生值(tolist远快于逐行装箱)，缺失值写入NULL（SQLite会将NaN存为NULL）
+        column_values = []
+        for col, dtype in df.dtypes.items():
+            values = df[col]
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                values = values.dt.strftime('%Y-%m-%d %H:%M:%S')
+            if isinstance(dtype, pd.api.extensions.ExtensionDtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+                values = values.astype(object).where(values.notna(), None)
+            column_values.append(values.tolist())
+
+        placeholders = ', '.join(['?'] * len(df.columns))
+        columns = ', '.join(f'"{col}"' for col in df.columns)
+        cur = self.conn.cursor()
+        cur.executemany(
+            f"INSERT INTO {table_name or self.table_name} ({columns}) VALUES ({placeholders})",
+            zip(*column_values)
+        )
+
+    def _get_business_key(self) -> List[str]:
+        """获取 define_schema 中声明的业务主键字段列表，未声明时返回空列表"""
+        business_key = self.define_schema().get('business_key') or []
+        if isinstance(business_key, str):
+            business_key = [business_key]
+        return list(business_key)
+
+    def _managed_fields(self, schema: Dict[str, List[str]]) -> set:
+        """由框架维护、不属于源数据的字段: 游标、控制字段、结果字段和内容哈希"""
+        return {self.cursor_field, self.status_field, self.retry_field, self.hash_field,
+                *schema.get('control_fields', []), *schema.get('result_fields', [])}
+
+    def _hash_rows(self, df: pd.DataFrame, columns: List[str]) -> pd.Series:
+        """
+        向量化计算每行源数据的内容哈希，以有符号64位整数存储
+
+        只对写入数据表的源字段(columns)计算，数据源新增的、不写入数据表的列不影响哈希。
+        各列先转换为统一的文本形式再哈希(见 _canonical_hash_values)，同一个值不会因为
+        不同批次/不同数据块推断出的类型不同(如 int64 与含空值的 float64)而被当作变更。
+        """
+        canonical = pd.DataFrame({c: self._canonical_hash_values(df[c]) for c in columns}, index=df.index)
+        hashes = pd.util.hash_pandas_object(canonical, index=False)
+        return pd.Series(hashes.to_numpy().view('int64'), index=df.index)
+
+    @staticmethod
+    def _canonical_hash_values(values: pd.Series) -> pd.Series:
+        """
+        把一列转换为与类型无关的文本形式(object列，空值为None): 整数值的浮点数按整数书写，
+        其余数值按float64书写，其他类型取字符串形式
+        """
+        missing = values.isna().to_numpy()
+        if pd.api.types.is_bool_dtype(values.dtype) or not pd.api.types.is_numeric_dtype(values.dtype):
+            text = values.astype(str)
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            text = values.astype(str)
+        else:
+            numbers = values.astype('float64')
+            integral = (~missing & np.isfinite(numbers) & (numbers == np.trunc(numbers))
+                        & (numbers.abs() < 2 ** 63)).to_numpy()
+            text = numbers.astype(str)
+            text[integral] = numbers[integral].astype('int64').astype(str)
+        result = text.astype(object)
+        result[missing] = None
+        return result
+
+    def _get_table_columns(self) -> List[str]:
+        """获取数据表现有的列名"""
+        cur = self.conn.cursor()
+        cur.execute(f"PRAGMA table_info({self.table_name})")
+        return [row[1] for row in cur.fetchall()]
+
+    def _ensure_business_key_index(self):
+        """为业务主键创建唯一索引，增量导入依赖它做匹配"""
+        key_columns = ', '.join(f'"{c}"' for c in self._get_business_key())
+        try:
+            self.conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{self.table_name}_business_key ON {self.table_name}({key_columns})"
+            )
+            self.conn.commit()
+        except sqlite3.IntegrityError as e:
+            raise ValueError(f"业务主键 {self._get_business_key()} 存在重复值，无法用于增量导入") from e
+
+    def _do_delta_import(self) -> int:
+        """
+        增量导入: 按业务主键比对数据源与现有数据表
+
+        - 新记录追加到表尾，作为待处理数据，游标ID接在现有最大值之后
+        - 已有记录保留处理结果；内容哈希变化的记录更新源字段，
+          reset_changed_rows=True 时同时重置为待处理
+        - 没有哈希的已有记录(声明业务主键前导入)按字段逐个比对，不一致时同步源字段，但不重置处理状态
+        - 每块数据先写入临时表，再用集合SQL完成插入和更新
+
+        Returns:
+            新增和变更的记录数
+        """
+        key_fields = self._get_business_key()
+        if not key_fields:
+            raise ValueError("增量导入需要在 define_schema 中声明 business_key")
+
+        self.logger.info(f"开始增量导入 (业务主键: {key_fields})...")
+        schema = self.define_schema()
+        start_time = time.perf_counter()
+
+        self._ensure_cursor_column_in_table()
+        if self.hash_field not in self._get_table_columns():
+            self.conn.execute(f"ALTER TABLE {self.table_name} ADD COLUMN {self.hash_field} INTEGER")
+        self._ensure_business_key_index()
+
+        table_columns = self._get_table_columns()
+        result_fields = schema.get('result_fields', [])
+        field_types = self._get_field_types()
+        empty_values = [self._empty_result_value(field, field_types) for field in result_fields]
+        control_fields = [f for f in schema.get('control_fields', []) if f not in (self.status_field, self.retry_field)]
+        managed = self._managed_fields(schema)
+        key_match = ' AND '.join(f't."{c}" IS s."{c}"' for c in key_fields)
+        staging = '_delta_staging'
+
+        inserted = changed = unhashed = 0
+        for chunk in self._iter_source_chunks():
+            chunk = chunk.drop_duplicates(subset=key_fields, keep='last')
+            self._fill_priority(chunk)
+            # 只比对数据表中已有的源字段，与全量导入时的哈希范围一致
+            source_columns = [c for c in chunk.columns if c in table_columns and c not in managed]
+            chunk[self.hash_field] = self._hash_rows(chunk, source_columns)
+
+            self._create_table(chunk[source_columns + [self.hash_field]], table_name=staging, temp=True)
+            self._bulk_insert(chunk[source_columns + [self.hash_field]], table_name=staging)
+
+            cur = self.conn.cursor()
+            assignments = [f'"{c}" = s."{c}"' for c in source_columns]
+            assignments.append(f"{self.hash_field} = s.{self.hash_field}")
+
+            # 未声明业务主键时导入的数据没有哈希，无法按哈希判断是否变更:
+            # 源字段与数据源不一致的记录同步源字段，其余只补写哈希；都不重置处理状态
+            differs = ' OR '.join(f't."{c}" IS NOT s."{c}"' for c in source_columns) or '0'
+            cur.execute(f"""
+            UPDATE {self.table_name} AS t SET {', '.join(assignments)}
+            FROM {staging} AS s WHERE {key_match} AND t.{self.hash_field} IS NULL AND ({differs})
+            """)
+            unhashed += cur.rowcount
+            cur.execute(f"""
+            UPDATE {self.table_name} AS t SET {self.hash_field} = s.{self.hash_field}
+            FROM {staging} AS s WHERE {key_match} AND t.{self.hash_field} IS NULL
+            """)
+
+            # 更新内容变化的记录
+            reset_values = []
+            if self.reset_changed_rows:
+                # 结果字段重置为字段的空值(声明了类型时为NULL或该类型的默认值)
+                assignments += [f"{self.status_field} = 0", f"{self.retry_field} = 0"]
+                assignments += [f'"{f}" = ?' for f in result_fields]
+                reset_values = empty_values
+            cur.execute(f"""
+            UPDATE {self.table_name} AS t SET {', '.join(assignments)}
+            FROM {staging} AS s WHERE {key_match} AND t.{self.hash_field} != s.{self.hash_field}
+            """, reset_values)
+            changed += cur.rowcount
+
+            # 追加新记录
+            insert_columns = source_columns + [self.hash_field, self.cursor_field, self.status_field, self.retry_field]
+            insert_columns += control_fields + result_fields
+            select_values = [f's."{c}"' for c in source_columns] + [f"s.{self.hash_field}"]
+            select_values.append(
+                f"(SELECT COALESCE(MAX({self.cursor_field}), 0) FROM {self.table_name}) + ROW_NUMBER() OVER (ORDER BY s.rowid)"
+            )
+            select_values += ['0', '0'] + ['NULL'] * len(control_fields) + ['?'] * len(result_fields)
+            cur.execute(f"""
+            INSERT INTO {self.table_name} ({', '.join(f'"{c}"' for c in insert_columns)})
+            SELECT {', '.join(select_values)}
+            FROM {staging} AS s
+            WHERE NOT EXISTS (SELECT 1 FROM {self.table_name} AS t WHERE {key_match})
+            """, empty_values)
+            inserted += cur.rowcount
+
+            cur.execute(f"DROP TABLE {staging}")
+            self.conn.commit()
+
+        elapsed = time.perf_counter() - start_time
+        self.logger.info(
+            f"增量导入完成，新增{inserted}条，变更{changed}条"
+            f"{'(已重置为待处理)' if self.reset_changed_rows else ''}"
+            f"{f'，无哈希记录同步源字段{unhashed}条(未重置)' if unhashed else ''}，耗时{elapsed:.2f}秒"
+        )
+        return inserted + changed + unhashed
+
+    def _iter_source_chunks(self) -> Iterator[pd.DataFrame]:
+        """按 import_chunksize 逐块读取数据源，未设置时整体作为一块返回"""
+        data_source = self.get_data_source()
+        columns = self._get_source_columns()
+        chunksize = self.import_chunksize
+
+        if isinstance(data_source, (list, tuple)) or (
+                isinstance(data_source, str) and any(ch in data_source for ch in '*?[')):
+            files = self._resolve_source_files(data_source)
+            self.logger.info(f"数据源包含{len(files)}个文件")
+            if self.import_workers > 1 and len(files) > 1:
+                yield from self._iter_files_parallel(files, columns)
+            else:
+                for path in files:
+                    yield from self._iter_file_chunks(path, columns)
+        elif isinstance(data_source, str):
+            yield from self._iter_file_chunks(data_source, columns)
         elif isinstance(data_source, pd.DataFrame):
-            df = data_source.copy()
+            if columns is not None:
+                data_source = data_source[[c for c in data_source.columns if c in columns]]
+            if chunksize:
+                for start in range(0, len(data_source), chunksize):
+                    yield data_source.iloc[start:start + chunksize].copy()
+            else:
+                yield data_source.copy()
         else:
             raise ValueError("数据源必须是文件路径或DataFrame对象")
 
-        # 若缺少游标字段（默认 _id），按顺序生成（从 1 开始）
-        if self.cursor_field and self.cursor_field not in df.columns:
-            df[self.cursor_field] = range(1, len(df) + 1)
+    @staticmethod
+    def _resolve_source_files(data_source: Union[str, List[str]]) -> List[str]:
+        """将通配符或文件列表展开为有序的文件列表，保证游标ID分配可复现"""
+        if isinstance(data_source, str):
+            files = sorted(glob.glob(data_source))
+        else:
+            files = sorted(data_source)
+        if not files:
+            raise ValueError(f"数据源没有匹配到任何文件: {data_source}")
+        return files
 
-        # 添加控制字段和结果字段
-        schema = self.define_schema()
+    def _iter_files_parallel(self, files: List[str], columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        在进程池中并行解析多个文件，按文件顺序逐个返回解析结果
+
+        同时最多有 2 * import_workers 个文件在解析或等待写入，限制内存占用。
+        """
+        file_iter = iter(files)
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.import_workers, mp_context=_mp_context()) as executor:
+            for path in file_iter:
+                pending.append((path, executor.submit(self._read_file, path, columns)))
+                if len(pending) >= self.import_workers * 2:
+                    break
+
+            while pending:
+                path, future = pending.popleft()
+                chunks = future.result()
+                next_path = next(file_iter, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(self._read_file, next_path, columns)))
+                self.logger.info(f"已解析文件: {path}")
+                yield from chunks
+
+    def _read_file(self, path: str, columns: Optional[List[str]] = None) -> List[pd.DataFrame]:
+        """在子进程中完整解析单个文件"""
+        return list(self._iter_file_chunks(path, columns))
+
+    def _get_source_columns(self) -> Optional[List[str]]:
+        """获取需要从数据源加载的列（source_fields + 游标字段），None表示全部列"""
+        source_fields = self.define_schema().get('source_fields')
+        if not source_fields:
+            return None
+        columns = list(source_fields)
+        if self.cursor_field and self.cursor_field not in columns:
+            columns.append(self.cursor_field)
+        return columns
+
+    def _iter_file_chunks(self, path: str, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        按文件格式逐块读取单个文件
+
+        CSV 支持 gzip / bz2 / xz / zstd 压缩(按扩展名或文件头识别)，
+        读取时流式解压，不落临时文件；zstd 需要安装 zstandard。
+        """
+        chunksize = self.import_chunksize
+        usecols = (lambda c: c in columns) if columns is not None else None
+        base_path, compression = _detect_compression(path)
+
+        if compression and not base_path.endswith('.csv'):
+            raise ValueError(f"只有CSV文件支持压缩读取: {path}")
+
+        if base_path.endswith('.csv') and self.csv_engine == 'pyarrow':
+            yield from self._iter_arrow_csv_chunks(path, compression, columns)
+        elif base_path.endswith('.csv'):
+            if chunksize:
+                with pd.read_csv(path, sep='\t', usecols=usecols, chunksize=chunksize,
+                                 compression=compression) as reader:
+                    yield from reader
+            else:
+                yield pd.read_csv(path, sep='\t', usecols=usecols, compression=compression)
+        elif path.endswith('.xlsx'):
+            # Excel 不支持分块读取
+            yield pd.read_excel(path, usecols=usecols)
+        elif path.endswith('.parquet'):
+            yield from self._iter_parquet_chunks(path, columns)
+        elif path.endswith(('.feather', '.arrow', '.ipc')):
+            yield from self._iter_arrow_ipc_chunks(path, columns)
+        else:
+            raise ValueError(f"不支持的文件格式: {path}")
+
+    def _iter_arrow_csv_chunks(self, path: str, compression: Optional[str] = None,
+                               columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        使用Arrow解析内存映射的CSV文件，按记录批次返回
+
+        未设置 import_chunksize 时整个文件多线程并行解析，列类型按整个文件推断；
+        设置后使用流式读取，每块 import_chunksize 行。流式读取时各列先按字符串解析，再逐块推断类型
+        (见 _infer_arrow_column_types，与pandas分块读取一致)，文件后部出现与前面类型不同的值时不会中途失败。
+        """
+        pa = _import_pyarrow('pyarrow')
+        pa_csv = _import_pyarrow('pyarrow.csv')
+
+        if compression == 'xz':
+            raise ValueError(f"pyarrow 解析方式不支持 xz 压缩，请使用 csv_engine='pandas': {path}")
+
+        def open_source():
+            source = pa.memory_map(path, 'r')
+            return pa.CompressedInputStream(source, compression) if compression else source
+
+        read_options = pa_csv.ReadOptions(use_threads=True, block_size=16 << 20)
+        parse_options = pa_csv.ParseOptions(delimiter='\t')
+        include_columns = []
+
+        if columns is not None or self.import_chunksize:
+            # 先读取表头，只解析文件中实际存在的需要的列
+            with open_source() as source:
+                header = pa_csv.open_csv(source, read_options=read_options, parse_options=parse_options).schema.names
+            include_columns = [c for c in header if columns is None or c in columns]
+
+        with open_source() as source:
+            if self.import_chunksize:
+                convert_options = pa_csv.ConvertOptions(
+                    include_columns=include_columns, strings_can_be_null=True,
+                    column_types={c: pa.string() for c in include_columns},
+                )
+                reader = pa_csv.open_csv(source, read_options=read_options, parse_options=parse_options,
+                                         convert_options=convert_options)
+                for table in self._rechunk_arrow_batches(reader, reader.schema, self.import_chunksize):
+                    yield self._infer_arrow_column_types(table).to_pandas()
+            else:
+                convert_options = pa_csv.ConvertOptions(include_columns=include_columns)
+                table = pa_csv.read_csv(source, read_options=read_options, parse_options=parse_options,
+                                        convert_options=convert_options)
+                for batch in table.to_batches(max_chunksize=1_000_000):
+                    yield batch.to_pandas()
+
+    @staticmethod
+    def _rechunk_arrow_batches(batches: Iterable, schema, chunksize: int) -> Iterator:
+        """把按数据块大小切分的记录批次重新组合为每块 chunksize 行的Arrow表(最后一块可能不足)"""
+        pa = _import_pyarrow('pyarrow')
+        buffered = pa.Table.from_batches([], schema=schema)
+        for batch in batches:
+            buffered = pa.concat_tables([buffered, pa.Table.from_batches([batch])])
+            while buffered.num_rows >= chunksize:
+                yield buffered.slice(0, chunksize)
+                buffered = buffered.slice(chunksize)
+        if buffered.num_rows:
+            yield buffered
+
+    @staticmethod
+    def _infer_arrow_column_types(table, sample_size: int = 1000):
+        """
+        按块推断字符串列的类型: 能整体转换为整数的列转为int64，否则尝试float64，都不行时保持字符串
+
+        转换失败的开销与整列转换相当，先用前 sample_size 行试转，前几行就不符合的类型直接跳过
+        """
+        pa = _import_pyarrow('pyarrow')
+        pc = _import_pyarrow('pyarrow.compute')
+        arrays = []
+        for array in table.columns:
+            for target in (pa.int64(), pa.float64()):
+                try:
+                    pc.cast(array.slice(0, sample_size), target)
+                    array = pc.cast(array, target)
+                    break
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    continue
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, names=table.column_names)
+
+    def _iter_parquet_chunks(self, path: str, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """逐个行组读取Parquet文件，只解码需要的列"""
+        pq = _import_pyarrow('pyarrow.parquet')
+
+        parquet_file = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [c for c in parquet_file.schema_arrow.names if c in columns]
+
+        if self.import_chunksize:
+            for batch in parquet_file.iter_batches(batch_size=self.import_chunksize, columns=columns):
+                yield batch.to_pandas()
+        else:
+            for i in range(parquet_file.num_row_groups):
+                yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+
+    def _iter_arrow_ipc_chunks(self, path: str, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """逐个记录批次读取Feather(v2)/Arrow IPC文件，基于内存映射只解码需要的列"""
+        pa = _import_pyarrow('pyarrow')
+
+        with pa.memory_map(path, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            if columns is not None:
+                columns = [c for c in reader.schema.names if c in columns]
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(columns)
+                yield batch.to_pandas()
+
+    def _prepare_import_chunk(self, df: pd.DataFrame, schema: Dict[str, List[str]], start_id: int) -> pd.DataFrame:
+        """
+        为一块源数据补充游标字段、控制字段和结果字段
+
+        Args:
+            df: 源数据块
+            schema: define_schema() 的返回值
+            start_id: 本块第一行的游标ID（缺少游标字段时使用）
+        """
+        self._fill_priority(df)
+
+        # 声明了业务主键时，为每行计算内容哈希，用于增量导入时的变更检测
+        if self._get_business_key():
+            managed = self._managed_fields(schema)
+            df[self.hash_field] = self._hash_rows(df, [c for c in df.columns if c not in managed])
+
+        # 若缺少游标字段（默认 _id），按顺序生成（从 1 开始，跨块连续）
+        if self.cursor_field and self.cursor_field not in df.columns:
+            df[self.cursor_field] = range(start_id, start_id + len(df))
 
         # 添加控制字段
         for field in schema.get('control_fields', []):
@@ -294,161 +1337,1048 @@ class BatchProcessor(ABC):
             else:
                 df[field] = None
 
+        field_types = self._get_field_types()
+        self._downcast_inputs(df, field_types)
+
         # 添加结果字段
         for field in schema.get('result_fields', []):
-            df[field] = ''
-
-        # 导入到SQLite
-        row_count = len(df)
-        if_exists_action = 'replace' if force_replace else 'replace'
-        df.to_sql(self.table_name, self.conn, if_exists=if_exists_action, index=False)
-
-        # 导入后为游标列创建索引以提升查询性能
-        try:
-            cur = self.conn.cursor()
-            cur.execute(
-                f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_{self.cursor_field} ON {self.table_name}({self.cursor_field})"
-            )
-            self.conn.commit()
-        except sqlite3.OperationalError:
-            pass
+            df[field] = self._empty_result_value(field, field_types)
 
-        self.logger.info(f"数据导入完成，共{row_count}条记录")
-        return row_count
+        return df
 
     def process_batches(self, debug_batch_times: Optional[int] = None) -> int:
         """
         批量处理数据
 
+        开启 retry_sweeps 时，主流程结束后再按退避时间对失败记录进行若干轮重试(见 _run_retry_sweeps)。
+
         Args:
             debug_batch_times: 调试模式下只处理指定数量的批次，None表示处理所有数据
 
         Returns:
             处理的总记录数
         """
-        cursor_id = 0
-        total_processed = 0
-        batch_count = 0
-
         if debug_batch_times:
             self.logger.info(f"开始批量处理 (调试模式: 限制{debug_batch_times}个批次)...")
         else:
             self.logger.info("开始批量处理...")
 
-        while True:
-            # 检查是否达到调试批次限制
-            if debug_batch_times and batch_count >= debug_batch_times:
-                self.logger.info(f"已达到调试批次限制({debug_batch_times}个批次)，停止处理")
-                break
+        if self.retry_sweeps:
+            self._ensure_retry_column()
+        self._check_pending_index_usage()
+        self._column_dtypes = None
+        self.run_metrics = {'batch_size_history': []} if self.adaptive_batch_size else {}
 
-            # 查询未处理的数据批次
-            batch_df = self._get_next_batch(cursor_id)
+        total_processed, batch_count = self._run_pass(debug_batch_times)
 
-            if batch_df.empty:
-                self.logger.info("没有更多数据需要处理")
-                break
+        # 调试模式只处理部分批次，不做重试；分片子进程的回填由主进程异步写入，重试交给主进程在分片结束后进行
+        if self.retry_sweeps and not debug_batch_times and self._write_queue is None:
+            total_processed += self._run_retry_sweeps()
 
-            try:
-                batch_count += 1
-                # 处理当前批次
-                processed_count = self._process_single_batch(batch_df)
-                total_processed += processed_count
+        if debug_batch_times:
+            self.logger.info(f"调试批量处理完成，处理了{batch_count}个批次，总共{total_processed}条记录")
+        else:
+            self.logger.info(f"批量处理完成，总共处理{total_processed}条记录")
+        if self.adaptive_batch_size:
+            sizes = [entry['batch_size'] for entry in self.run_metrics['batch_size_history']]
+            if sizes:
+                self.logger.info(f"自适应批次大小: {min(sizes)}~{max(sizes)}，当前为{self.batch_size}")
+        return total_processed
 
-                # 更新游标
-                cursor_id = batch_df[self.cursor_field].iloc[-1]
+    def _run_pass(self, debug_batch_times: Optional[int] = None) -> tuple:
+        """
+        按游标顺序把待处理记录完整处理一遍
 
-                if debug_batch_times:
-                    self.logger.info(f"已处理第{batch_count}个批次，共{processed_count}条数据, 当前游标ID为{cursor_id}")
-                else:
-                    self.logger.info(f"已处理{total_processed}条数据, 当前游标ID为{cursor_id}")
+        Returns:
+            (处理的记录数, 批次数)
+        """
+        if self.engine == 'pipeline':
+            return self._run_pipeline_pass(debug_batch_times)
+        if self.max_inflight_batches > 1 or self.business_logic_workers:
+            return self._run_inflight_pass(debug_batch_times)
+
+        cursor_id = 0
+        total_processed = 0
+        batch_count = 0
+
+        batches = self._iter_batches()
+        try:
+            while True:
+                # 检查是否达到调试批次限制
+                if debug_batch_times and batch_count >= debug_batch_times:
+                    self.logger.info(f"已达到调试批次限制({debug_batch_times}个批次)，停止处理")
+                    break
+
+                # 查询未处理的数据批次
+                batch_df = next(batches, None)
+
+                if batch_df is None:
+                    self.logger.info("没有更多数据需要处理")
+                    break
+
+                try:
+                    batch_count += 1
+                    # 处理当前批次
+                    processed_count = self._process_single_batch(batch_df)
+                    total_processed += processed_count
+
+                    # 更新游标
+                    cursor_id = batch_df[self.cursor_field].iloc[-1]
+
+                    if debug_batch_times:
+                        self.logger.info(f"已处理第{batch_count}个批次，共{processed_count}条数据, 当前游标ID为{cursor_id}")
+                    else:
+                        self.logger.info(f"已处理{total_processed}条数据, 当前游标ID为{cursor_id}")
+
+                except Exception as e:
+                    self.logger.error(f"处理批次时发生错误: {str(e)}", exc_info=e)
+                    # 可以选择继续处理下一批次或停止
+                    cursor_id = batch_df[self.cursor_field].iloc[-1]
+                    batch_count += 1  # 错误的批次也要计数
+                    if self.retry_sweeps:
+                        self._schedule_batch_retry(batch_df)
+                    continue
+        finally:
+            batches.close()
+
+        return total_processed, batch_count
+
+    def _run_inflight_pass(self, debug_batch_times: Optional[int] = None) -> tuple:
+        """
+        同时处理 max_inflight_batches 个批次
 
+        批次按顺序读取后交给线程池执行业务逻辑(_build_updates)，当前线程按完成先后回填，
+        每完成一批就补读下一批。设置了 business_logic_workers 时业务逻辑转交给子进程池执行
+        (见 _build_updates_in_pool)，同时处理的批次数至少为子进程数。进度游标只推进到"之前的批次都已结束"的位置，
+        中间某批失败时该批计为结束(开启 retry_sweeps 时安排重试)，不影响其他批次。
+
+        Returns:
+            (处理的记录数, 批次数)
+        """
+        total_processed = 0
+        batch_count = 0
+        # 已提交批次的序号 -> 批次最后一条记录的游标ID；已结束但前面还有未结束批次的序号
+        pending_cursors = {}
+        finished = set()
+        next_to_finish = 0
+        cursor_id = self._cursor_range[0]
+
+        inflight_limit = max(self.max_inflight_batches, self.business_logic_workers)
+        build_updates = self._build_updates
+        logic_pool = None
+        if self.business_logic_workers:
+            # 子进程与主进程共用同一个 resource_tracker: 否则各子进程各自启动一个，
+            # 退出时把主进程已释放的共享内存当作泄漏再清理一遍并告警
+            resource_tracker.ensure_running()
+            logic_pool = ProcessPoolExecutor(max_workers=self.business_logic_workers, mp_context=_mp_context(),
+                                             initializer=_init_logic_worker, initargs=(self,))
+            # 在启动回填线程和预取线程之前由当前线程一次创建全部子进程:
+            # 其他线程持有锁(如共享内存的 resource_tracker 锁)时fork，子进程会卡在该锁上
+            logic_pool.submit(int).result()
+            build_updates = functools.partial(self._build_updates_in_pool, logic_pool)
+
+        batches = self._iter_batches()
+        executor = ThreadPoolExecutor(max_workers=inflight_limit, thread_name_prefix='batch-inflight')
+        inflight = {}
+        try:
+            while True:
+                # 补足同时处理的批次
+                while len(inflight) < inflight_limit and not (
+                        debug_batch_times and batch_count >= debug_batch_times):
+                    batch_df = next(batches, None)
+                    if batch_df is None:
+                        break
+                    pending_cursors[batch_count] = batch_df[self.cursor_field].iloc[-1]
+                    inflight[executor.submit(build_updates, batch_df)] = (batch_count, batch_df)
+                    batch_count += 1
+
+                if not inflight:
+                    if debug_batch_times and batch_count >= debug_batch_times:
+                        self.logger.info(f"已达到调试批次限制({debug_batch_times}个批次)，停止处理")
+                    else:
+                        self.logger.info("没有更多数据需要处理")
+                    break
+
+                done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    seq, batch_df = inflight.pop(future)
+                    try:
+                        updates = future.result()
+                        if updates:
+                            self._batch_update(updates)
+                        total_processed += len(updates)
+                    except Exception as e:
+                        self.logger.error(f"处理第{seq + 1}个批次时发生错误: {str(e)}", exc_info=e)
+                        if self.retry_sweeps:
+                            self._schedule_batch_retry(batch_df)
+
+                    # 推进到连续结束的批次末尾
+                    finished.add(seq)
+                    while next_to_finish in finished:
+                        finished.remove(next_to_finish)
+                        cursor_id = pending_cursors.pop(next_to_finish)
+                        next_to_finish += 1
+
+                self.logger.info(f"已处理{total_processed}条数据, 已完成至游标ID {cursor_id}，"
+                                 f"处理中{len(inflight)}个批次")
+        finally:
+            for future in inflight:
+                future.cancel()
+            executor.shutdown(wait=True)
+            if logic_pool is not None:
+                logic_pool.shutdown(wait=True)
+            batches.close()
+
+        return total_processed, batch_count
+
+    def _build_updates_in_pool(self, logic_pool: ProcessPoolExecutor, batch_df: pd.DataFrame) -> List[List]:
+        """
+        在子进程中执行业务逻辑并生成回填记录
+
+        批次以Arrow IPC格式写入共享内存，只把共享内存名传给子进程，DataFrame本身不经过pickle；
+        子进程以同样方式返回结果字段，主进程按行位置合并回批次后生成回填记录。
+        """
+        shm, size = _frame_to_shared_memory(batch_df)
+        try:
+            result_name, result_size = logic_pool.submit(_run_logic_worker, shm.name, size).result()
+        except Exception as e:
+            if self.bisect_failures and len(batch_df) > 1:
+                return self._bisect_updates(batch_df, functools.partial(self._build_updates_in_pool, logic_pool), e)
+            raise
+        finally:
+            shm.close()
+            shm.unlink()
+
+        result_shm = shared_memory.SharedMemory(name=result_name)
+        try:
+            result_df = _frame_from_shared_memory(result_shm, result_size)
+        finally:
+            result_shm.close()
+            result_shm.unlink()
+
+        positions = result_df.pop('__position').to_numpy()
+        result_df.index = batch_df.index[positions]
+        return self._updates_from_result(batch_df, result_df)
+
+    def _run_pipeline_pass(self, debug_batch_times: Optional[int] = None) -> tuple:
+        """
+        以流水线方式把待处理记录处理一遍
+
+        读取 → fetch_external_data → process_business_logic → 回填 四个阶段由有界队列连接:
+        - 读取: 后台线程使用独立连接按顺序读取(或认领)批次
+        - fetch_external_data / process_business_logic: 各自使用 stage_concurrency 个线程
+        - 回填: 在当前线程中使用主连接写入，按批次完成的先后顺序
+        第N+1批的外部调用与第N批的业务处理、回填同时进行。结束后各阶段的
+        忙碌时间和利用率记录在 self.stage_metrics 中，利用率接近100%的阶段即瓶颈。
+
+        Returns:
+            (处理的记录数, 批次数)
+        """
+        if self.claim_mode:
+            self._ensure_claim_columns()
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        workers = {stage: 1 for stage in PIPELINE_STAGES}
+        workers.update({stage: max(1, int(n)) for stage, n in self.stage_concurrency.items()})
+        metrics = {stage: {'workers': n, 'batches': 0, 'busy_seconds': 0.0} for stage, n in workers.items()}
+        metrics_lock = threading.Lock()
+        stop_event = threading.Event()
+        # queues[i] 是第i个阶段的输出队列；元素为 (类型, 批次, 数据) 或结束标记None
+        queues = [queue.Queue(maxsize=self.stage_queue_size) for _ in range(3)]
+
+        def put(q, item) -> bool:
+            while not stop_event.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(q):
+            while not stop_event.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return None
+
+        def record(stage: str, started: float):
+            with metrics_lock:
+                metrics[stage]['batches'] += 1
+                metrics[stage]['busy_seconds'] += time.perf_counter() - started
+
+        def reader():
+            conn = self._connect()
+            try:
+                position = self._start_position()
+                count = 0
+                while not (debug_batch_times and count >= debug_batch_times):
+                    started = time.perf_counter()
+                    batch_df = self._fetch_batch(position, conn=conn)
+                    if batch_df.empty:
+                        break
+                    record('read', started)
+                    count += 1
+                    if not put(queues[0], ('batch', batch_df, None)):
+                        return
+                    position = self._batch_position(batch_df)
             except Exception as e:
-                self.logger.error(f"处理批次时发生错误: {str(e)}", exc_info=e)
-                # 可以选择继续处理下一批次或停止
+                put(queues[0], ('error', None, e))
+            finally:
+                conn.close()
+                for _ in range(workers['fetch_external_data']):
+                    put(queues[0], None)
+
+        def fetch_external(batch_df: pd.DataFrame):
+            batch_df.attrs['external_data'] = self.fetch_external_data(batch_df)
+            return batch_df
+
+        # 中间阶段: (阶段名, 执行函数, 输出类型)；每个阶段最后退出的线程向下游发送结束标记
+        stage_specs = [
+            ('fetch_external_data', fetch_external, 'batch'),
+            ('process_business_logic', self._build_updates, 'updates'),
+        ]
+        remaining = {stage: workers[stage] for stage, _, _ in stage_specs}
+        downstream_workers = [workers['process_business_logic'], 1]
+
+        def stage_worker(index: int):
+            stage, func, output_kind = stage_specs[index]
+            in_queue, out_queue = queues[index], queues[index + 1]
+            try:
+                while True:
+                    item = get(in_queue)
+                    if item is None:
+                        return
+                    kind, batch_df, payload = item
+                    if kind == 'batch':
+                        started = time.perf_counter()
+                        try:
+                            item = (output_kind, batch_df, func(batch_df))
+                        except Exception as e:
+                            self.logger.error(f"{PIPELINE_STAGES[stage]}阶段处理批次时发生错误: {str(e)}", exc_info=e)
+                            item = ('failed', batch_df, e)
+                        record(stage, started)
+                    # 失败的批次和读取错误原样传给下游
+                    if not put(out_queue, item):
+                        return
+            finally:
+                with metrics_lock:
+                    remaining[stage] -= 1
+                    last = remaining[stage] == 0
+                if last:
+                    for _ in range(downstream_workers[index]):
+                        put(out_queue, None)
+
+        threads = [threading.Thread(target=reader, name='pipeline-read', daemon=True)]
+        for index, (stage, _, _) in enumerate(stage_specs):
+            threads += [threading.Thread(target=stage_worker, args=(index,), name=f'pipeline-{stage}-{i}', daemon=True)
+                        for i in range(workers[stage])]
+
+        pass_started = time.perf_counter()
+        total_processed = 0
+        batch_count = 0
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is None:
+                    break
+                kind, batch_df, payload = item
+                if kind == 'error':
+                    raise payload
+
+                started = time.perf_counter()
+                batch_count += 1
                 cursor_id = batch_df[self.cursor_field].iloc[-1]
-                batch_count += 1  # 错误的批次也要计数
-                continue
+                if kind == 'updates':
+                    if payload:
+                        self._batch_update(payload)
+                    total_processed += len(payload)
+                    if debug_batch_times:
+                        self.logger.info(f"已处理第{batch_count}个批次，共{len(payload)}条数据, 游标ID为{cursor_id}")
+                    else:
+                        self.logger.info(f"已处理{total_processed}条数据, 游标ID为{cursor_id}")
+                elif self.retry_sweeps:
+                    self._schedule_batch_retry(batch_df)
+                record('write', started)
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        elapsed = max(time.perf_counter() - pass_started, 1e-9)
+        for stage, m in metrics.items():
+            m['utilization'] = m['busy_seconds'] / (elapsed * m['workers'])
+        self.stage_metrics = metrics
+        self.logger.info("流水线各阶段利用率: " + " | ".join(
+            f"{PIPELINE_STAGES[stage]} {m['utilization']:.0%} ({m['workers']}线程, {m['batches']}批)"
+            for stage, m in metrics.items()
+        ))
+        return total_processed, batch_count
+
+    def _ensure_retry_column(self):
+        """确保表中存在下次尝试时间字段"""
+        if self.next_attempt_field not in self._get_table_columns():
+            self.conn.execute(f"ALTER TABLE {self.table_name} ADD COLUMN {self.next_attempt_field} REAL")
+            self.conn.commit()
+            self._column_dtypes = None
+
+    def _retry_delay(self, retry_count: int) -> float:
+        """
+        第 retry_count 次失败后的退避时间: 指数增长并以 retry_backoff_max 为上限，
+        在后一半区间内随机取值，避免同一批失败的记录在同一时刻集中重试
+        """
+        delay = min(self.retry_backoff_max, self.retry_backoff_base * 2 ** max(retry_count - 1, 0))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _sweep_batch_size(self, sweep: int, batch_size: int) -> int:
+        """
+        第 sweep 轮重试的批次大小: 从 batch_size 按几何级数缩小，最后一轮为1，
+        整批失败的批次在后续轮次中被拆开，问题记录最终被单独处理
+        """
+        return max(1, round(batch_size ** (1 - sweep / self.retry_sweeps)))
+
+    def _schedule_batch_retry(self, batch_df: pd.DataFrame):
+        """
+        整批处理失败，按退避时间安排下次尝试
+
+        多条记录的批次无法区分哪些记录有问题，不增加重试次数，避免正常记录因与问题记录同批
+        而耗尽重试次数；重试轮次中批次逐轮缩小(见 _sweep_batch_size)。单条记录的批次重试次数加1。
+        """
+        self._batch_update(self._failed_updates(batch_df, count_retry=len(batch_df) == 1))
+
+    def _failed_updates(self, batch_df: pd.DataFrame, count_retry: bool = True) -> List[List]:
+        """
+        批次内每条记录按处理失败生成回填记录
+
+        Args:
+            count_retry: 是否增加重试次数；为False时只按下一次失败的退避时间安排下次尝试
+        """
+        field_types = self._get_field_types()
+        empty_values = [self._empty_result_value(field, field_types)
+                        for field in self.define_schema().get('result_fields', [])]
+        return [
+            self._failed_update_record(empty_values, int(retry_count) + count_retry, int(cursor_id),
+                                       failures=int(retry_count) + 1)
+            for retry_count, cursor_id in zip(batch_df[self.retry_field], batch_df[self.cursor_field])
+        ]
+
+    def _pending_retry_summary(self, due_before: Optional[float] = None) -> tuple:
+        """
+        本进程游标区间内仍可重试的记录数，以及其中最早、最晚的下次尝试时间
+
+        Args:
+            due_before: 只统计下次尝试时间不晚于该时刻的记录
+        """
+        lower, upper = self._cursor_range
+        due_at = f"COALESCE({self.next_attempt_field}, 0)"
+        conditions = [self._pending_condition(), f"{self.cursor_field} > {int(lower)}"]
+        if upper is not None:
+            conditions.append(f"{self.cursor_field} <= {int(upper)}")
+        if due_before is not None:
+            conditions.append(f"{due_at} <= {due_before!r}")
+        cur = self.conn.cursor()
+        cur.execute(
+            f"SELECT COUNT(*), MIN({due_at}), MAX({due_at}) FROM {self.table_name} WHERE {' AND '.join(conditions)}"
+        )
+        return cur.fetchone()
+
+    def _run_retry_sweeps(self) -> int:
+        """
+        对失败记录进行至多 retry_sweeps 轮重试
+
+        每轮覆盖本轮开始时所有可重试的记录: 按各记录的下次尝试时间依次等待，
+        每次按游标顺序处理一遍已到期的记录，直到本轮的记录都已重试过；
+        仍然失败的记录退避时间翻倍，留给下一轮。没有可重试记录时提前结束。
+        批次大小逐轮缩小(见 _sweep_batch_size)，结束后恢复。
+
+        Returns:
+            重试轮次中处理的记录数
+        """
+        total_processed = 0
+        batch_size = self.batch_size
+        try:
+            for sweep in range(1, self.retry_sweeps + 1):
+                pending, _, sweep_deadline = self._pending_retry_summary()
+                if not pending:
+                    break
+                self.batch_size = self._sweep_batch_size(sweep, batch_size)
+                self.logger.info(f"开始第{sweep}轮重试，共{pending}条记录待重试，批次大小{self.batch_size}")
+
+                while True:
+                    pending, due_at, _ = self._pending_retry_summary(due_before=sweep_deadline)
+                    if not pending:
+                        break
+                    wait = due_at - time.time()
+                    if wait > 0:
+                        self.logger.info(f"第{sweep}轮重试: 等待{wait:.1f}秒后重试{pending}条记录中已到期的部分")
+                        time.sleep(wait)
+
+                    self._retry_due_at = time.time()
+                    try:
+                        processed, _ = self._run_pass()
+                    finally:
+                        self._retry_due_at = None
+                    total_processed += processed
+        finally:
+            self.batch_size = batch_size
 
-        if debug_batch_times:
-            self.logger.info(f"调试批量处理完成，处理了{batch_count}个批次，总共{total_processed}条记录")
-        else:
-            self.logger.info(f"批量处理完成，总共处理{total_processed}条记录")
         return total_processed
 
-    def _get_next_batch(self, cursor_id: int) -> pd.DataFrame:
-        """获取下一批待处理数据"""
-        query = f"""
-        SELECT *
-        FROM {self.table_name}
-        WHERE {self.cursor_field} > {cursor_id}
-        AND ({self.status_field} = 0 OR {self.status_field} IS FALSE)
-        AND {self.retry_field} < {self.max_retries}
-        ORDER BY {self.cursor_field}
-        LIMIT {self.batch_size}
+    def _iter_batches(self) -> Iterator[pd.DataFrame]:
         """
+        按游标顺序(声明了优先级字段时按优先级从高到低)逐批返回待处理数据
 
-        return pd.read_sql(query, self.conn)
+        游标在每批读取后推进到该批最后一条记录，与该批处理成功与否无关；
+        开启 prefetch_batches 时由后台线程提前读取；认领模式下每批通过租约认领获得。
+        """
+        if self.claim_mode:
+            self._ensure_claim_columns()
 
-    def _process_single_batch(self, batch_df: pd.DataFrame) -> int:
-        """处理单个批次的数据"""
+        if self.prefetch_batches > 0:
+            yield from self._iter_batches_prefetch()
+            return
+
+        position = self._start_position()
+        while True:
+            batch_df = self._fetch_batch(position)
+            if batch_df.empty:
+                return
+            yield batch_df
+            position = self._batch_position(batch_df)
+
+    def _iter_batches_prefetch(self) -> Iterator[pd.DataFrame]:
+        """
+        后台线程使用独立连接预读批次，最多缓存 prefetch_batches 个批次
+
+        预读的批次游标都大于正在处理的批次，主线程的回填不会影响它们的内容。
+        数据库切换为WAL模式，读取与回填写入互不阻塞。
+        """
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        batch_queue = queue.Queue(maxsize=self.prefetch_batches)
+        stop_event = threading.Event()
+
+        def put(item) -> bool:
+            while not stop_event.is_set():
+                try:
+                    batch_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def reader():
+            conn = self._connect()
+            try:
+                position = self._start_position()
+                while True:
+                    batch_df = self._fetch_batch(position, conn=conn)
+                    if batch_df.empty:
+                        put(None)
+                        return
+                    if not put(batch_df):
+                        return
+                    position = self._batch_position(batch_df)
+            except Exception as e:
+                put(e)
+            finally:
+                conn.close()
+
+        thread = threading.Thread(target=reader, name='batch-prefetch', daemon=True)
+        thread.start()
         try:
-            # 执行批量业务逻辑处理
-            processed_df = self.process_business_logic(batch_df.copy())
+            while True:
+                item = batch_queue.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+            thread.join()
+
+    def _fetch_batch(self, position, conn: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+        """读取下一批: 认领模式下认领一批记录，否则从 position 之后查询"""
+        if self.claim_mode:
+            return self._claim_next_batch(conn)
+        return self._get_next_batch(position, conn=conn)
+
+    def _start_position(self):
+        """
+        批次查询的起始位置: 游标ID；声明了优先级字段时为 (优先级, 游标ID)，
+        起始优先级取正无穷，从最高优先级开始
+        """
+        if self._get_priority_field():
+            return float('inf'), self._cursor_range[0]
+        return self._cursor_range[0]
+
+    def _batch_position(self, batch_df: pd.DataFrame):
+        """批次最后一条记录的位置，作为下一批查询的起点，格式同 _start_position"""
+        cursor_id = int(batch_df[self.cursor_field].iloc[-1])
+        priority_field = self._get_priority_field()
+        if priority_field:
+            priority = batch_df[priority_field].iloc[-1]
+            return (priority.item() if isinstance(priority, np.generic) else priority), cursor_id
+        return cursor_id
+
+    def _ensure_claim_columns(self):
+        """确保表中存在认领者和租约字段，并切换为WAL模式以支持多进程并发读写"""
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        # 多个进程可能同时启动，检查和加列在同一个写事务中完成
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            columns = self._get_table_columns()
+            for field, sql_type in ((self.claimed_by_field, 'TEXT'), (self.lease_field, 'REAL')):
+                if field not in columns:
+                    cur.execute(f"ALTER TABLE {self.table_name} ADD COLUMN {field} {sql_type}")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self._column_dtypes = None
 
-            # 准备更新记录
-            updates = []
-            schema = self.define_schema()
-            result_fields = schema.get('result_fields', [])
+    def _claim_next_batch(self, conn: Optional[sqlite3.Connection] = None,
+                          worker_id: Optional[str] = None) -> pd.DataFrame:
+        """
+        原子地认领下一批待处理记录
+
+        单条 UPDATE ... RETURNING 在写事务中选出未被认领(或租约已过期)的待处理记录，
+        写入认领者标识(默认本进程的 worker_id)和租约到期时间并返回这些记录，
+        多个进程并发认领不会重复。
+        """
+        conn = conn or self.conn
+        worker_id = worker_id or self.worker_id
+        now = time.time()
+        columns = ', '.join(f'"{c}"' for c in self._get_batch_columns()) or '*'
+        claim_sql = f"""
+        UPDATE {self.table_name}
+        SET {self.claimed_by_field} = ?, {self.lease_field} = ?
+        WHERE {self.cursor_field} IN (
+            SELECT {self.cursor_field}
+            FROM {self.table_name}
+            WHERE {self._pending_condition()}
+            AND ({self.claimed_by_field} IS NULL OR {self.lease_field} < ?)
+            ORDER BY {self._pending_order()}
+            LIMIT ?
+        )
+        RETURNING {columns}
+        """
 
-            for idx, row in batch_df.iterrows():
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute(claim_sql, (worker_id, now + self.lease_seconds, now, self.batch_size))
+            rows = cur.fetchall()
+            columns = [d[0] for d in cur.description]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        batch_df = self._rows_to_frame(rows, columns, conn)
+        priority_field = self._get_priority_field()
+        if priority_field:
+            return batch_df.sort_values([priority_field, self.cursor_field], ascending=[False, True], ignore_index=True)
+        return batch_df.sort_values(self.cursor_field, ignore_index=True)
+
+    def process_batches_sharded(self, workers: int, debug_batch_times: Optional[int] = None) -> int:
+        """
+        按游标区间分片，在多个进程中并行处理
+
+        待处理记录按游标顺序切分为 workers 个连续区间，每个区间的待处理记录数相同。
+        每个分片进程使用独立的数据库连接和游标读取数据、执行业务逻辑，
+        回填结果通过队列交给主进程统一写入，避免多个进程争抢SQLite写锁。
+
+        Args:
+            workers: 分片(进程)数
+            debug_batch_times: 调试模式下每个分片只处理指定数量的批次
+
+        Returns:
+            处理的总记录数
+        """
+        if self.claim_mode:
+            raise ValueError("分片处理不能与认领模式同时使用")
+        if self._get_priority_field():
+            raise ValueError("分片按游标区间划分，不能与优先级字段同时使用")
+
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        if self.retry_sweeps:
+            self._ensure_retry_column()
+        self._shard_ranges = self._compute_shards(workers)
+        if not self._shard_ranges:
+            self.logger.info("没有更多数据需要处理")
+            return 0
+        self.logger.info(f"开始分片处理，共{len(self._shard_ranges)}个分片: {self._shard_ranges}")
+
+        ctx = _mp_context()
+        write_queue = ctx.Queue(maxsize=len(self._shard_ranges) * 4)
+        processes = [
+            ctx.Process(target=_run_shard, name=f'batch-shard-{i}',
+                        args=(self, i, lower, upper, write_queue, debug_batch_times))
+            for i, (lower, upper) in enumerate(self._shard_ranges)
+        ]
+        for process in processes:
+            process.start()
+
+        shard_written = [0] * len(processes)
+        finished = set()
+        try:
+            while len(finished) < len(processes):
                 try:
-                    # 获取处理后的结果
-                    processed_row = processed_df.loc[idx]
+                    kind, shard, payload = write_queue.get(timeout=1)
+                except queue.Empty:
+                    for i, process in enumerate(processes):
+                        if i not in finished and not process.is_alive() and process.exitcode != 0:
+                            raise RuntimeError(f"分片{i}进程异常退出 (exitcode={process.exitcode})")
+                    continue
+
+                if kind == 'update':
+                    self._batch_update(payload)
+                    shard_written[shard] += len(payload)
+                    self.logger.info(f"分片{shard}已处理{shard_written[shard]}条数据，全部分片共{sum(shard_written)}条")
+                elif kind == 'done':
+                    finished.add(shard)
+                    self.logger.info(f"分片{shard}处理完成，共{payload}条数据")
+                elif kind == 'error':
+                    finished.add(shard)
+                    self.logger.error(f"分片{shard}处理失败: {payload}")
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+        total_processed = sum(shard_written)
+        # 各分片的回填已全部写入，失败记录的重试在主进程中进行
+        if self.retry_sweeps and not debug_batch_times:
+            total_processed += self._run_retry_sweeps()
+        self.logger.info(f"分片批量处理完成，总共处理{total_processed}条记录")
+        return total_processed
 
-                    # 构建更新记录: [is_processed, result_field1, result_field2, ..., retry_count, id]
-                    update_record = [True]  # is_processed = True
+    def _compute_shards(self, workers: int) -> List[tuple]:
+        """按待处理记录数均分游标区间，返回 [(lower, upper), ...]，区间为左开右闭，最后一个分片无上界"""
+        cur = self.conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE {self._pending_condition()}")
+        pending = cur.fetchone()[0]
+        if pending == 0:
+            return []
+
+        workers = max(1, min(workers, pending))
+        boundaries = []
+        for k in range(1, workers):
+            cur.execute(
+                f"SELECT {self.cursor_field} FROM {self.table_name} WHERE {self._pending_condition()} "
+                f"ORDER BY {self.cursor_field} LIMIT 1 OFFSET ?",
+                (k * pending // workers - 1,)
+            )
+            boundaries.append(cur.fetchone()[0])
 
-                    # 添加结果字段值
-                    for field in result_fields:
-                        value = processed_row.get(field, '')
-                        # 确保值不是NaN
-                        if pd.isna(value):
-                            value = ''
-                        update_record.append(value)
+        lowers = [self._cursor_range[0]] + boundaries
+        uppers = boundaries + [None]
+        return list(zip(lowers, uppers))
 
-                    # 添加重试次数和ID
-                    update_record.append(row[self.retry_field])  # retry_count保持不变
-                    update_record.append(row[self.cursor_field])  # WHERE条件的ID
+    def _get_batch_columns(self) -> List[str]:
+        """
+        每批需要查询的列: input_fields + 游标字段、状态字段、重试字段(以及优先级字段)
 
-                    updates.append(update_record)
+        未声明 input_fields 时返回空列表，表示查询全部列
+        """
+        input_fields = self.define_schema().get('input_fields')
+        if not input_fields:
+            return []
+        columns = list(input_fields)
+        for field in (self.cursor_field, self.status_field, self.retry_field, self._get_priority_field()):
+            if field and field not in columns:
+                columns.append(field)
+        return columns
+
+    def _next_batch_query(self) -> str:
+        """
+        下一批待处理数据的参数化查询语句，参数见 _next_batch_params
 
-                except Exception as e:
-                    self.logger.error(f"处理行{row[self.cursor_field]}时出错: {str(e)}", exc_info=e)
-                    # 增加重试次数，结果字段设为空
-                    retry_count = row[self.retry_field] + 1
-                    update_record = [False] + [''] * len(result_fields) + [retry_count, row[self.cursor_field]]
-                    updates.append(update_record)
+        声明了优先级字段时按 (优先级降序, 游标) 做键集分页: 先用 优先级 <= 上一批末尾的优先级
+        在索引上定位，同一优先级内再跳过游标不大于上一批末尾的记录，顺序由部分索引直接给出，无需排序。
+        """
+        columns = ', '.join(f'"{c}"' for c in self._get_batch_columns()) or '*'
+        priority_field = self._get_priority_field()
+        if priority_field:
+            position_condition = (f"AND {priority_field} <= ? "
+                                  f"AND ({priority_field} < ? OR {self.cursor_field} > ?)")
+        else:
+            position_condition = f"AND {self.cursor_field} > ?"
+        upper_condition = f"AND {self.cursor_field} <= ?" if self._cursor_range[1] is not None else ""
+        due_condition = (f"AND COALESCE({self.next_attempt_field}, 0) <= ?"
+                         if self._retry_due_at is not None else "")
+        return f"""
+        SELECT {columns}
+        FROM {self.table_name}
+        WHERE {self._pending_condition()}
+        {position_condition}
+        {upper_condition}
+        {due_condition}
+        ORDER BY {self._pending_order()}
+        LIMIT ?
+        """
+
+    def _next_batch_params(self, position) -> tuple:
+        """批次查询参数: (游标ID 或 优先级, 优先级, 游标ID, [分片游标上界], [重试截止时间], 批次大小)"""
+        if self._get_priority_field():
+            priority, cursor_id = position
+            params = [priority, priority, int(cursor_id)]
+        else:
+            params = [int(position)]
+        if self._cursor_range[1] is not None:
+            params.append(int(self._cursor_range[1]))
+        if self._retry_due_at is not None:
+            params.append(self._retry_due_at)
+        params.append(self.batch_size)
+        return tuple(params)
+
+    def _get_next_batch(self, position, conn: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+        """
+        获取下一批待处理数据
+
+        使用参数化语句(sqlite3按连接缓存预编译语句)直接读取元组，
+        再按缓存的列类型逐列构建numpy数组，避免 pd.read_sql 每批重新推断类型。
+        """
+        conn = conn or self.conn
+        cur = conn.cursor()
+        cur.execute(self._next_batch_query(), self._next_batch_params(position))
+        rows = cur.fetchmany(self.batch_size)
+        columns = [d[0] for d in cur.description]
+        return self._rows_to_frame(rows, columns, conn)
+
+    def _get_column_dtypes(self, conn: sqlite3.Connection) -> Dict[str, Any]:
+        """根据表的列声明和 field_types 得到各列的numpy类型，结果缓存"""
+        if self._column_dtypes is None:
+            affinity_dtypes = {'INTEGER': np.int64, 'INT': np.int64, 'REAL': np.float64}
+            field_dtypes = {'int': np.int64, 'float': np.float64, 'float32': np.float32}
+            dtypes = {}
+            for _, name, declared_type, *_ in conn.execute(f"PRAGMA table_info({self.table_name})").fetchall():
+                dtypes[name] = affinity_dtypes.get((declared_type or '').upper(), object)
+            for field, (type_name, _) in self._get_field_types().items():
+                dtypes[field] = field_dtypes.get(type_name, object)
+            self._column_dtypes = dtypes
+        return self._column_dtypes
+
+    def _rows_to_frame(self, rows: List[tuple], columns: List[str], conn: sqlite3.Connection) -> pd.DataFrame:
+        """将查询得到的元组按列转换为DataFrame"""
+        dtypes = self._get_column_dtypes(conn)
+        column_values = list(zip(*rows)) if rows else [()] * len(columns)
+        data = {}
+        for column, values in zip(columns, column_values):
+            dtype = dtypes.get(column, object)
+            # INTEGER列中也可能存有REAL值(如分块导入时列类型取自第一块)或NULL，只有全部为整数时才按int64构建
+            if dtype is np.int64 and not all(type(value) is int for value in values):
+                data[column] = self._infer_column(values)
+                continue
+            try:
+                data[column] = np.array(values, dtype=dtype)
+            except (TypeError, ValueError):
+                data[column] = self._infer_column(values)
+        return pd.DataFrame(data, columns=columns)
+
+    @staticmethod
+    def _infer_column(values: tuple) -> np.ndarray:
+        """按 pd.read_sql 的方式推断列类型: 含NULL的整数列为float64(NaN)，整数与小数混合为float64"""
+        return pd.Series(list(values), dtype=None).to_numpy()
+
+    def _to_fetch_format(self, batch_df: pd.DataFrame):
+        """将批次数据转换为 fetch_format 指定的格式"""
+        if self.fetch_format == 'records':
+            return batch_df.to_dict(orient='records')
+        if self.fetch_format == 'arrow':
+            pa = _import_pyarrow('pyarrow')
+            return pa.RecordBatch.from_pandas(batch_df, preserve_index=False)
+        return batch_df.copy()
+
+    def _from_fetch_format(self, result, batch_df: pd.DataFrame) -> pd.DataFrame:
+        """将业务逻辑的返回结果统一转换为与批次索引对齐的DataFrame"""
+        if isinstance(result, pd.DataFrame):
+            return result
+        if isinstance(result, list):
+            return pd.DataFrame(result, index=batch_df.index)
+        if hasattr(result, 'to_pandas'):
+            result_df = result.to_pandas()
+            result_df.index = batch_df.index
+            return result_df
+        raise TypeError(f"process_business_logic 返回了不支持的类型: {type(result)}")
+
+    def _process_single_batch(self, batch_df: pd.DataFrame) -> int:
+        """
+        处理单个批次的数据；开启 adaptive_batch_size 时按本批耗时和失败记录数调整后续批次的大小
+        (重试轮次中批次大小由 _sweep_batch_size 决定，不做调整)
+        """
+        started = time.perf_counter()
+        failed_rows = len(batch_df)
+        try:
+            updates = self._build_updates(batch_df)
 
             # 批量更新数据库
             if updates:
                 self._batch_update(updates)
 
+            failed_rows = sum(1 for update in updates if not update[0])
             return len(updates)
+        finally:
+            if self.adaptive_batch_size and self._retry_due_at is None:
+                self._adapt_batch_size(len(batch_df), time.perf_counter() - started, failed_rows)
+
+    def _adapt_batch_size(self, rows: int, seconds: float, failed_rows: int):
+        """
+        按加性增、乘性减(AIMD)调整下一批的大小:
+        - 有处理失败的记录(含整批失败): 减半，接口异常时尽快缩小每批的影响范围
+        - 耗时超过 target_batch_seconds: 按 目标耗时/实际耗时 等比缩小，至多减半
+        - 否则增加初始 batch_size 的1/10
+        结果限制在 [min_batch_size, max_batch_size] 内，每批的情况记录在 run_metrics['batch_size_history'] 中
+        """
+        size = self.batch_size
+        if failed_rows:
+            new_size = size // 2
+        elif seconds > self.target_batch_seconds:
+            new_size = int(size * max(0.5, self.target_batch_seconds / seconds))
+        else:
+            new_size = size + self._batch_size_step
+        new_size = min(max(new_size, self.min_batch_size), self.max_batch_size)
+
+        self.run_metrics.setdefault('batch_size_history', []).append({
+            'batch_size': size, 'rows': rows, 'seconds': seconds, 'failed_rows': failed_rows,
+        })
+        if new_size < size:
+            self.logger.info(f"批次大小调整为{new_size}: 上一批{rows}条，耗时{seconds:.1f}秒，失败{failed_rows}条")
+        self.batch_size = new_size
+
+    def _build_updates(self, batch_df: pd.DataFrame) -> List[List]:
+        """
+        对一个批次执行业务逻辑，生成回填记录(不访问数据库)
+
+        开启 bisect_failures 时整批失败不抛出异常，而是二分定位失败记录(见 _bisect_updates)；
+        只剩单条记录仍失败时抛出异常。
+
+        Returns:
+            更新记录列表，每条格式见 _get_update_fields: [is_processed, 结果字段..., retry_count, [next_attempt_at], id]
+        """
+        try:
+            # 执行批量业务逻辑处理
+            result = self.process_business_logic(self._to_fetch_format(batch_df))
+            return self._updates_from_result(batch_df, result)
 
         except Exception as e:
+            if self.bisect_failures and len(batch_df) > 1:
+                return self._bisect_updates(batch_df, self._build_updates, e)
             self.logger.error(f"处理批次时发生错误: {str(e)}", exc_info=e)
             raise
 
+    def _bisect_updates(self, batch_df: pd.DataFrame, build_updates: Callable, error: Exception) -> List[List]:
+        """
+        批次处理失败后拆成两半分别用 build_updates 重新处理
+
+        build_updates 对多条记录的批次失败时会继续拆分，只有单条记录仍失败时才抛出异常，
+        此时按处理失败回填该记录。少数几条问题记录时，重新调用业务逻辑的次数约为
+        2 * log2(批次大小) * 问题记录数。
+        """
+        self.logger.warning(f"{len(batch_df)}条记录的批次处理失败({error})，拆分为两半重新处理")
+        middle = len(batch_df) // 2
+        updates = []
+        for half in (batch_df.iloc[:middle], batch_df.iloc[middle:]):
+            try:
+                updates.extend(build_updates(half))
+            except Exception as e:
+                cursor_id = half[self.cursor_field].iloc[0]
+                self.logger.error(f"游标ID {cursor_id} 单独处理仍失败，按处理失败记录: {str(e)}")
+                updates.extend(self._failed_updates(half))
+        return updates
+
+    def _updates_from_result(self, batch_df: pd.DataFrame, result) -> List[List]:
+        """
+        将业务逻辑的返回结果转换为回填记录
+
+        按列处理: 结果按批次索引对齐后，逐个结果字段取出整列、空值替换为字段的空值，
+        再与重试次数、游标ID按行拼接。批次中没有(或有重复)对应结果行的记录视为处理失败，重试次数加1。
+        """
+        processed_df = self._from_fetch_format(result, batch_df)
+
+        schema = self.define_schema()
+        result_fields = schema.get('result_fields', [])
+        field_types = self._get_field_types()
+        empty_values = [self._empty_result_value(field, field_types) for field in result_fields]
+
+        # 有效行: 结果中恰好有一行与之对应
+        duplicated = processed_df.index.duplicated(keep=False)
+        unique_results = processed_df[~duplicated]
+        valid = batch_df.index.isin(unique_results.index)
+        aligned = unique_results.reindex(batch_df.index[valid])
+
+        # 构建更新记录: [is_processed, result_field1, result_field2, ..., retry_count, [next_attempt_at], id]
+        columns = [[True] * int(valid.sum())]
+        for field, empty_value in zip(result_fields, empty_values):
+            if field not in aligned.columns:
+                columns.append([empty_value] * len(aligned))
+                continue
+            values = aligned[field]
+            if values.dtype == object:
+                # numpy标量转换为Python原生类型
+                values = values.map(lambda v: v.item() if isinstance(v, np.generic) else v)
+            # 空值替换为字段的空值；转为object后 tolist 得到Python原生类型
+            columns.append(values.astype(object).where(values.notna(), empty_value).tolist())
+        columns.append(batch_df[self.retry_field][valid].astype('int64').tolist())  # retry_count保持不变
+        if self.retry_sweeps:
+            columns.append([None] * len(aligned))  # 处理成功，清除下次尝试时间
+        columns.append(batch_df[self.cursor_field][valid].astype('int64').tolist())  # WHERE条件的ID
+
+        updates = [list(record) for record in zip(*columns)]
+
+        # 没有对应结果的行: 增加重试次数，结果字段设为空
+        if not valid.all():
+            failed = batch_df[~valid]
+            failed_ids = failed[self.cursor_field].astype('int64').tolist()
+            self.logger.error(f"{len(failed_ids)}行没有唯一对应的处理结果，按处理失败记录: 游标ID {failed_ids[:20]}"
+                              + (" ..." if len(failed_ids) > 20 else ""))
+            for retry_count, cursor_id in zip(failed[self.retry_field].astype('int64').tolist(), failed_ids):
+                updates.append(self._failed_update_record(empty_values, retry_count + 1, cursor_id))
+
+        return updates
+
+    def _failed_update_record(self, empty_values: List[Any], retry_count: int, cursor_id: int,
+                              failures: Optional[int] = None) -> List:
+        """
+        处理失败记录的回填记录: 结果字段为空，写入新的重试次数；开启 retry_sweeps 时同时安排下次尝试时间
+
+        Args:
+            failures: 计算退避时间使用的失败次数，默认等于 retry_count
+        """
+        record = [False] + list(empty_values) + [retry_count]
+        if self.retry_sweeps:
+            record.append(time.time() + self._retry_delay(retry_count if failures is None else failures))
+        record.append(cursor_id)
+        return record
+
     def _get_update_fields(self) -> List[str]:
         """获取需要更新的字段列表"""
         schema = self.define_schema()
         fields = [self.status_field]
         fields.extend(schema.get('result_fields', []))
         fields.append(self.retry_field)
+        if self.retry_sweeps:
+            fields.append(self.next_attempt_field)
         return fields
 
-    def _batch_update(self, updates: List[List]):
-        """批量更新数据库"""
+    def _batch_update(self, updates: List[List], worker_id: Optional[str] = None):
+        """
+        批量更新数据库
+
+        Args:
+            updates: 更新记录列表
+            worker_id: 只回填该认领者仍持有租约的记录；未指定时认领模式下使用本进程的 worker_id
+        """
+        # 分片子进程不直接写库，交给主进程统一写入
+        if self._write_queue is not None:
+            self._write_queue.put(('update', self._shard_index, updates))
+            return
+
         update_fields = self._get_update_fields()
         placeholders = ', '.join([f"{field} = ?" for field in update_fields])
 
@@ -458,18 +2388,38 @@ class BatchProcessor(ABC):
         WHERE {self.cursor_field} = ?
         """
 
+        # 认领模式下只回填仍由认领者持有租约的记录，租约过期被他人认领的记录以对方结果为准
+        owner = worker_id or (self.worker_id if self.claim_mode else None)
+        if owner:
+            update_sql += f" AND {self.claimed_by_field} = ?"
+            updates = [list(update) + [owner] for update in updates]
+
         cursor = self.conn.cursor()
         cursor.executemany(update_sql, updates)
         self.conn.commit()
 
     def get_statistics(self) -> Dict[str, int]:
-        """获取处理统计信息"""
+        """
+        获取处理统计信息
+
+        分片处理后还包含每个分片的统计: shard{i}_total / shard{i}_processed / shard{i}_pending
+        """
+        shard_columns = ''
+        for i, (lower, upper) in enumerate(self._shard_ranges):
+            in_shard = f"{self.cursor_field} > {lower}"
+            if upper is not None:
+                in_shard += f" AND {self.cursor_field} <= {upper}"
+            shard_columns += f""",
+            SUM(CASE WHEN {in_shard} THEN 1 ELSE 0 END) as shard{i}_total,
+            SUM(CASE WHEN {in_shard} AND {self.status_field} = 1 THEN 1 ELSE 0 END) as shard{i}_processed,
+            SUM(CASE WHEN {in_shard} AND {self._pending_condition()} THEN 1 ELSE 0 END) as shard{i}_pending"""
+
         stats_query = f"""
         SELECT
             COUNT(*) as total,
             SUM(CASE WHEN {self.status_field} = 1 THEN 1 ELSE 0 END) as processed,
-            SUM(CASE WHEN {self.status_field} = 0 AND {self.retry_field} < {self.max_retries} THEN 1 ELSE 0 END) as pending,
-            SUM(CASE WHEN {self.retry_field} >= {self.max_retries} THEN 1 ELSE 0 END) as failed
+            SUM(CASE WHEN {self._pending_condition()} THEN 1 ELSE 0 END) as pending,
+            SUM(CASE WHEN {self.retry_field} >= {self.max_retries} THEN 1 ELSE 0 END) as failed{shard_columns}
         FROM {self.table_name}
         """
 
@@ -483,7 +2433,7 @@ class BatchProcessor(ABC):
         else:
             query = f"SELECT * FROM {self.table_name}"
 
-        df = pd.read_sql(query, self.conn)
+        df = self._apply_field_types(pd.read_sql(query, self.conn))
 
         if output_path.endswith('.csv'):
             df.to_csv(output_path, index=False, sep='\t')
@@ -494,12 +2444,13 @@ class BatchProcessor(ABC):
 
         self.logger.info(f"结果已导出到: {output_path}")
 
-    def run(self, debug_batch_times: Optional[int] = None):
+    def run(self, debug_batch_times: Optional[int] = None, workers: int = 1):
         """
         运行完整的批处理流程
 
         Args:
             debug_batch_times: 调试模式下只处理指定数量的批次，None表示处理所有数据
+            workers: 大于1时按游标区间分片，在多个进程中并行处理(见 process_batches_sharded)
         """
         start_time = datetime.now()
         if debug_batch_times:
@@ -512,7 +2463,10 @@ class BatchProcessor(ABC):
             import_count = self.import_data()
 
             # 处理数据
-            process_count = self.process_batches(debug_batch_times)
+            if workers > 1:
+                process_count = self.process_batches_sharded(workers, debug_batch_times)
+            else:
+                process_count = self.process_batches(debug_batch_times)
 
             # 输出统计信息
             stats = self.get_statistics()
@@ -0,0 +1,112 @@
+"""
+租约认领模式基准测试: claim_mode=True 下1/2/4/8个工作进程的吞吐量和重复处理检查
+
+用法(在项目根目录下运行):
+    python benchmarks/bench_claim_workers.py
+    python benchmarks/bench_claim_workers.py --rows 10000 --workers 1 4 16 --latency 0.05
+
+业务逻辑只休眠 --latency 秒模拟一次接口调用，进程数不超过CPU核数时吞吐量应近似线性增长，
+超过后受限于每批的读写开销和SQLite写锁。计时从所有进程启动完成后开始。
+每次运行后检查: 所有进程实际处理的行数之和等于总行数(没有记录被重复认领或处理)，
+且每条记录的结果都由认领它的进程写入。
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_processor import BatchProcessor
+
+
+class ClaimBenchProcessor(BatchProcessor):
+    rows = 0
+    latency = 0.0
+    processed_rows = None
+
+    def get_data_source(self):
+        return pd.DataFrame({'order_id': range(self.rows)})
+
+    def define_schema(self):
+        return {'control_fields': ['is_processed', 'retry_count'], 'result_fields': ['handled_by']}
+
+    def process_business_logic(self, batch_data):
+        time.sleep(self.latency)
+        with self.processed_rows.get_lock():
+            self.processed_rows.value += len(batch_data)
+        batch_data['handled_by'] = self.worker_id
+        return batch_data
+
+
+def work(db_name: str, batch_size: int, worker_id: str, rows: int, latency: float, processed_rows, ready):
+    """工作进程入口: 导入模块、建立连接后在屏障处等待，计时不包含进程启动"""
+    ClaimBenchProcessor.rows = rows
+    ClaimBenchProcessor.latency = latency
+    ClaimBenchProcessor.processed_rows = processed_rows
+    processor = ClaimBenchProcessor(db_name=db_name, batch_size=batch_size, claim_mode=True, worker_id=worker_id)
+    processor.logger.setLevel(logging.WARNING)
+    ready.wait()
+    processor.process_batches()
+    processor.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help='每批业务逻辑的模拟耗时(秒)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--dir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    ClaimBenchProcessor.rows = args.rows
+    db_name = os.path.join(args.dir, 'bench_claim.db')
+    context = multiprocessing.get_context('spawn')
+    print(f"{args.rows}行, batch_size={args.batch_size}, 每批模拟耗时{args.latency * 1000:.0f}ms")
+
+    for workers in args.workers:
+        for path in (db_name, f'{db_name}-wal', f'{db_name}-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        processor = ClaimBenchProcessor(db_name=db_name)
+        processor.logger.setLevel(logging.WARNING)
+        processor.import_data()
+
+        processed_rows = context.Value('q', 0)
+        ready = context.Barrier(workers + 1)
+        processes = [
+            context.Process(target=work, args=(db_name, args.batch_size, f'w{i}', args.rows, args.latency, processed_rows, ready))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        ready.wait()
+        started = time.perf_counter()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        stats = processor.get_statistics()
+        mismatched = processor.conn.execute(
+            f"SELECT COUNT(*) FROM {processor.table_name} WHERE {processor.claimed_by_field} != handled_by"
+        ).fetchone()[0]
+        processor.conn.close()
+        assert stats['processed'] == args.rows, stats
+        assert processed_rows.value == args.rows, f"处理了{processed_rows.value}行，存在重复处理"
+        assert mismatched == 0, f"{mismatched}条记录的结果不是由认领它的进程写入"
+        print(f"  workers={workers}: {elapsed:6.2f}秒 ({args.rows / elapsed:,.0f} 行/秒), 无重复处理")
+
+    for path in (db_name, f'{db_name}-wal', f'{db_name}-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+CSV解析基准测试: csv_engine='pandas' 与 'pyarrow' 的解析耗时和峰值内存
+
+用法(在项目根目录下运行，需要安装pyarrow):
+    python benchmarks/bench_csv_parse.py
+    python benchmarks/bench_csv_parse.py --rows 1000000 10000000 --chunksize 500000
+
+每种组合在独立的子进程中只做解析(不写入SQLite)，峰值内存为子进程的最大RSS(仅Linux/macOS)。
+pyarrow 的RSS包含内存映射文件中已读入的页，这部分是可回收的页缓存。
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+
+def write_source(path: str, rows: int, block: int = 1_000_000):
+    """分块生成5列的制表符分隔文件: 字符串、整数、小数、低基数类别、整数"""
+    rng = np.random.default_rng(0)
+    for start in range(0, rows, block):
+        n = min(block, rows - start)
+        pd.DataFrame({
+            'order_id': np.char.add('o', np.arange(start, start + n).astype(str)),
+            'user_id': rng.integers(0, 1_000_000, n),
+            'amount': rng.random(n).round(4) * 1000,
+            'city': rng.choice(['bj', 'sh', 'gz', 'sz'], n),
+            'qty': rng.integers(1, 10, n),
+        }).to_csv(path, sep='\t', index=False, mode='w' if start == 0 else 'a', header=start == 0)
+
+
+def peak_rss_mb() -> float:
+    """当前进程的最大RSS(MB)，不支持的平台返回NaN"""
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def parse(path: str, engine: str, chunksize, results):
+    """子进程入口: 读取全部数据块，返回 (行数, 耗时, 解析前RSS MB, 峰值RSS MB)"""
+    sys.path.insert(0, PROJECT_DIR)
+    from batch_processor import BatchProcessor
+
+    class ParseBenchProcessor(BatchProcessor):
+        def get_data_source(self):
+            return path
+
+        def define_schema(self):
+            return {}
+
+        def process_business_logic(self, batch_data):
+            return batch_data
+
+    processor = ParseBenchProcessor(db_name=':memory:', csv_engine=engine, import_chunksize=chunksize)
+    processor.logger.setLevel(logging.WARNING)
+    if engine == 'pyarrow':
+        import pyarrow.csv  # noqa: F401  导入开销不计入解析
+    baseline_mb = peak_rss_mb()
+    started = time.perf_counter()
+    rows = sum(len(chunk) for chunk in processor._iter_source_chunks())
+    elapsed = time.perf_counter() - started
+    results.put((rows, elapsed, baseline_mb, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--chunksize', type=int, default=500_000,
+                        help='流式读取时的 import_chunksize，另外也测试一次性读取(不分块)')
+    parser.add_argument('--dir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    for rows in args.rows:
+        path = os.path.join(args.dir, f'bench_csv_{rows}.csv')
+        write_source(path, rows)
+        print(f"{rows}行, 文件大小 {os.path.getsize(path) / 1e6:.0f}MB")
+        try:
+            for chunksize in (None, args.chunksize):
+                for engine in ('pandas', 'pyarrow'):
+                    results = context.Queue()
+                    worker = context.Process(target=parse, args=(path, engine, chunksize, results))
+                    worker.start()
+                    parsed, elapsed, baseline_mb, peak_mb = results.get()
+                    worker.join()
+                    assert parsed == rows, (parsed, rows)
+                    print(f"  import_chunksize={str(chunksize):>7} {engine:>8}: {elapsed:6.2f}秒, "
+                          f"峰值RSS {peak_mb:6.0f}MB (解析前 {baseline_mb:.0f}MB)")
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+导入写入方式基准测试: DataFrame.to_sql 与 import_engine='bulk'
+
+用法(在项目根目录下运行):
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --rows 10000000 --dir /data/tmp
+
+数据库文件写在 --dir 指定的目录中(默认系统临时目录)，关闭日志与同步对真实磁盘的影响比tmpfs更明显。
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_processor import BatchProcessor
+
+
+def make_source(rows: int) -> pd.DataFrame:
+    """生成9列的测试数据: 字符串、整数、小数、低基数类别和日期混合"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'order_id': np.char.add('o', np.arange(rows).astype(str)),
+        'user_id': rng.integers(0, 1_000_000, rows),
+        'amount': rng.random(rows) * 1000,
+        'city': rng.choice(['bj', 'sh', 'gz', 'sz'], rows),
+        'qty': rng.integers(1, 10, rows),
+        'price': rng.random(rows) * 100,
+        'status': rng.choice(['paid', 'refund', 'open'], rows),
+        'created': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 86400 * 365, rows), unit='s'),
+        'note': rng.choice(['', 'vip', 'gift', 'urgent'], rows),
+    })
+
+
+class ImportBenchProcessor(BatchProcessor):
+    source = None
+
+    def get_data_source(self):
+        return self.source
+
+    def define_schema(self):
+        return {'control_fields': ['is_processed', 'retry_count'], 'result_fields': ['result1', 'result2']}
+
+    def process_business_logic(self, batch_data):
+        return batch_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    parser.add_argument('--dir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    ImportBenchProcessor.source = make_source(args.rows)
+    db_name = os.path.join(args.dir, 'bench_import.db')
+    print(f"{args.rows}行 x {ImportBenchProcessor.source.shape[1]}列, import_chunksize={args.chunksize}, 数据库: {db_name}")
+
+    for engine in ('to_sql', 'bulk'):
+        if os.path.exists(db_name):
+            os.remove(db_name)
+        processor = ImportBenchProcessor(db_name=db_name, import_engine=engine, import_chunksize=args.chunksize)
+        processor.logger.setLevel(logging.WARNING)
+        started = time.perf_counter()
+        processor.import_data(force_reimport=True)
+        elapsed = time.perf_counter() - started
+        processor.conn.close()
+        print(f"{engine:>8}: {elapsed:6.2f}秒 ({args.rows / elapsed:,.0f} 行/秒)")
+
+    os.remove(db_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+待处理记录部分索引基准测试: 查找下一批的耗时随已处理比例的变化
+
+用法(在项目根目录下运行):
+    python benchmarks/bench_pending_index.py
+    python benchmarks/bench_pending_index.py --rows 10000000 --batch-size 500
+
+用 EXPLAIN QUERY PLAN 断言批次查询(无优先级字段和声明了优先级字段两种情况)使用了部分索引，
+并分别在有部分索引和删除部分索引(只剩游标主键)时，测量已处理0%/50%/90%/99%下 _get_next_batch 的平均耗时。
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_processor import BatchProcessor
+
+
+class IndexBenchProcessor(BatchProcessor):
+    source = None
+    priority_field = None
+
+    def get_data_source(self):
+        return self.source
+
+    def define_schema(self):
+        schema = {'control_fields': ['is_processed', 'retry_count'], 'result_fields': ['result1']}
+        if self.priority_field:
+            schema['priority_field'] = self.priority_field
+        return schema
+
+    def process_business_logic(self, batch_data):
+        return batch_data
+
+
+def query_plan(processor: BatchProcessor) -> str:
+    """批次查询的查询计划文本"""
+    cur = processor.conn.execute(f"EXPLAIN QUERY PLAN {processor._next_batch_query()}",
+                                 processor._next_batch_params(processor._start_position()))
+    return ' '.join(str(row[-1]) for row in cur.fetchall())
+
+
+def mean_latency_ms(processor: BatchProcessor, repeat: int) -> float:
+    position = processor._start_position()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        processor._get_next_batch(position)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--dir', default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    IndexBenchProcessor.source = pd.DataFrame({
+        'order_id': np.char.add('o', np.arange(args.rows).astype(str)),
+        'amount': rng.random(args.rows) * 1000,
+        'priority': rng.integers(0, 5, args.rows),
+    })
+    db_name = os.path.join(args.dir, 'bench_pending_index.db')
+    if os.path.exists(db_name):
+        os.remove(db_name)
+
+    processor = IndexBenchProcessor(db_name=db_name, batch_size=args.batch_size, import_engine='bulk')
+    processor.logger.setLevel(logging.WARNING)
+    processor.import_data(force_reimport=True)
+    plan = query_plan(processor)
+    assert processor._pending_index_name() in plan, plan
+    print(f"查询计划使用 {processor._pending_index_name()}")
+    table, cursor, status = processor.table_name, processor.cursor_field, processor.status_field
+    print(f"{args.rows}行, batch_size={args.batch_size}, 每项取{args.repeat}次平均")
+
+    for label in ('部分索引', '只有游标主键'):
+        if label == '只有游标主键':
+            processor.conn.execute(f"DROP INDEX {processor._pending_index_name()}")
+        processor.conn.execute(f"UPDATE {table} SET {status} = 0")
+        processor.conn.commit()
+        for fraction in (0, 0.5, 0.9, 0.99):
+            processor.conn.execute(f"UPDATE {table} SET {status} = 1 WHERE {cursor} <= ?", (int(args.rows * fraction),))
+            processor.conn.commit()
+            print(f"  {label:>8} 已处理{fraction:4.0%}: {mean_latency_ms(processor, args.repeat):8.2f}ms")
+
+    processor.conn.close()
+
+    # 声明优先级字段后部分索引按 (优先级降序, 游标) 重建，批次查询同样要使用它
+    IndexBenchProcessor.priority_field = 'priority'
+    processor = IndexBenchProcessor(db_name=db_name, batch_size=args.batch_size)
+    processor._ensure_pending_index()
+    plan = query_plan(processor)
+    assert processor._pending_index_name() in plan, plan
+    print(f"priority_field='priority': 查询计划使用 {processor._pending_index_name()}")
+    processor.conn.close()
+    os.remove(db_name)
+
+
+if __name__ == '__main__':
+    main()
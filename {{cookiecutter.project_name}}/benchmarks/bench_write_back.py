@@ -0,0 +1,123 @@
+"""
+结果回填基准测试: 按列构建回填记录(_updates_from_result) 与原来逐行 iterrows 的实现
+
+用法(在项目根目录下运行):
+    python benchmarks/bench_write_back.py
+    python benchmarks/bench_write_back.py --rows 1000 10000 100000 1000000
+
+先在1000行上确认两种实现生成的回填记录完全相同(包括缺失结果行按失败记录、空值替换和类型)，
+再测量不同批次大小下生成回填记录的耗时。只计时回填记录的构建，不包含SQLite写入。
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_processor import BatchProcessor
+
+
+class WriteBackBenchProcessor(BatchProcessor):
+    def get_data_source(self):
+        return None
+
+    def define_schema(self):
+        return {
+            'control_fields': ['is_processed', 'retry_count'],
+            'result_fields': ['label', 'score', 'ratio'],
+            'field_types': {'ratio': 'float'},
+        }
+
+    def process_business_logic(self, batch_data):
+        return batch_data
+
+
+def iterrows_updates(processor: BatchProcessor, batch_df: pd.DataFrame, result) -> list:
+    """原来逐行的实现，作为对照"""
+    processed_df = processor._from_fetch_format(result, batch_df)
+
+    updates = []
+    schema = processor.define_schema()
+    result_fields = schema.get('result_fields', [])
+    field_types = processor._get_field_types()
+    empty_values = [processor._empty_result_value(field, field_types) for field in result_fields]
+
+    for idx, row in batch_df.iterrows():
+        try:
+            processed_row = processed_df.loc[idx]
+            update_record = [True]
+            for field, empty_value in zip(result_fields, empty_values):
+                value = processed_row.get(field, empty_value)
+                if pd.isna(value):
+                    value = empty_value
+                elif isinstance(value, np.generic):
+                    value = value.item()
+                update_record.append(value)
+            update_record.append(int(row[processor.retry_field]))
+            if processor.retry_sweeps:
+                update_record.append(None)
+            update_record.append(int(row[processor.cursor_field]))
+            updates.append(update_record)
+        except Exception:
+            retry_count = int(row[processor.retry_field]) + 1
+            updates.append(processor._failed_update_record(empty_values, retry_count, int(row[processor.cursor_field])))
+
+    return updates
+
+
+def make_frames(processor: BatchProcessor, rows: int):
+    """生成批次和业务逻辑结果: 字符串列含空值，浮点列含NaN，缺少两行结果"""
+    batch_df = pd.DataFrame({
+        processor.cursor_field: np.arange(1, rows + 1),
+        processor.status_field: 0,
+        processor.retry_field: np.zeros(rows, dtype=np.int64),
+        'order_id': np.arange(rows),
+    })
+    result = batch_df.copy()
+    result['label'] = [f's{i}' if i % 10 else None for i in range(rows)]
+    result['score'] = np.arange(rows) * 2
+    result['ratio'] = np.where(np.arange(rows) % 7 == 0, np.nan, np.arange(rows) / 3)
+    return batch_df, result.drop(index=[3, 5])
+
+
+def best_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    processor = WriteBackBenchProcessor(db_name=':memory:')
+    processor.logger.setLevel(logging.CRITICAL)
+
+    # 失败记录在按列实现中排在最后，按游标ID排序后比较
+    batch_df, result = make_frames(processor, 1000)
+    expected = sorted(iterrows_updates(processor, batch_df, result), key=lambda record: record[-1])
+    actual = sorted(processor._updates_from_result(batch_df, result), key=lambda record: record[-1])
+    assert actual == expected, next((a, e) for a, e in zip(actual, expected) if a != e)
+    assert [list(map(type, record)) for record in actual] == [list(map(type, record)) for record in expected]
+    print("1000行: 两种实现的回填记录一致")
+
+    for rows in args.rows:
+        batch_df, result = make_frames(processor, rows)
+        columnar_ms = best_ms(lambda: processor._updates_from_result(batch_df, result), args.repeat)
+        iterrows_ms = best_ms(lambda: iterrows_updates(processor, batch_df, result), 1 if rows >= 100_000 else args.repeat)
+        print(f"  {rows:>8}行: iterrows {iterrows_ms:9.1f}ms, 按列 {columnar_ms:7.1f}ms ({iterrows_ms / columnar_ms:.0f}倍)")
+
+
+if __name__ == '__main__':
+    main()
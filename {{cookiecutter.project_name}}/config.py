@@ -19,7 +19,8 @@ DATA_CONFIG = {
 # 缓存配置
 CACHE_CONFIG = {
     'enable': {{ 'True' if cookiecutter.enable_cache == 'y' else 'False' }},
-    'size': {{ cookiecutter.cache_size }}
+    'size': {{ cookiecutter.cache_size }},
+    'ttl': None  # 缓存过期时间(秒)，None表示不过期
 }
 
 # 日志配置
@@ -0,0 +1,274 @@
+"""
+BatchCoordinator - 多机批处理协调服务
+
+协调进程持有SQLite数据表，通过HTTP向其他机器上的工作进程分发批次:
+1. 工作进程请求租约，协调进程原子认领一批记录并返回
+2. 工作进程在本地执行 process_business_logic，把回填记录发回协调进程
+3. 协调进程通过 _batch_update 写入结果；租约超时未回填的记录会重新分发
+
+示例:
+    # 协调机器
+    processor = MyProcessor(db_name='orders.db', batch_size=100, lease_seconds=120)
+    processor.import_data()
+    BatchCoordinator(processor, port=8765).serve_forever()
+
+    # 工作机器(本地不需要数据库，db_name 使用内存库即可)
+    processor = MyProcessor(db_name=':memory:')
+    RemoteWorker(processor, 'http://coordinator-host:8765').run()
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import requests
+
+from batch_processor import BatchProcessor
+
+
+class BatchCoordinator:
+    """
+    批次协调服务
+
+    接口(均为JSON):
+        POST /lease     {"worker_id"}                      -> {"batch", "pending", "retry_after"}
+        POST /complete  {"worker_id", "fields", "updates"} -> {"written"}
+        POST /fail      {"worker_id", "cursor_ids", "error"} -> {"failed"}
+        GET  /stats                                        -> get_statistics() 的结果
+    """
+
+    def __init__(self, processor: BatchProcessor, host: str = '0.0.0.0', port: int = 8765):
+        """
+        初始化协调服务
+
+        Args:
+            processor: 持有数据表的处理器(数据需已导入)，使用其 batch_size / lease_seconds 分发批次
+            host: 监听地址
+            port: 监听端口，传0时由系统分配(见 self.port)
+        """
+        self.processor = processor
+        self.logger = logging.getLogger(__name__)
+
+        # HTTP请求在多个线程中处理，共用一个允许跨线程的连接，并用锁串行化数据库访问
+        processor.conn.close()
+        processor.conn = processor._connect(check_same_thread=False)
+        processor._ensure_claim_columns()
+        if processor.retry_sweeps:
+            processor._ensure_retry_column()
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.port = self.server.server_address[1]
+        self._thread = None
+
+    def _make_handler(self):
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/stats':
+                    self._reply(200, coordinator.statistics())
+                else:
+                    self._reply(404, {'error': f'unknown path {self.path}'})
+
+            def do_POST(self):
+                routes = {
+                    '/lease': coordinator.lease,
+                    '/complete': coordinator.complete,
+                    '/fail': coordinator.fail,
+                }
+                if self.path not in routes:
+                    self._reply(404, {'error': f'unknown path {self.path}'})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                    self._reply(200, routes[self.path](body))
+                except Exception as e:
+                    coordinator.logger.error(f"处理请求 {self.path} 时出错: {str(e)}", exc_info=e)
+                    self._reply(500, {'error': str(e)})
+
+            def _reply(self, status: int, payload: Dict[str, Any]):
+                data = json.dumps(payload, default=str).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                coordinator.logger.debug(format % args)
+
+        return Handler
+
+    def lease(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """为工作进程认领一批记录；没有可认领记录时返回剩余待处理数和建议的等待时间"""
+        worker_id = body['worker_id']
+        p = self.processor
+        with self._lock:
+            batch_df = p._claim_next_batch(worker_id=worker_id)
+            if not batch_df.empty:
+                self.logger.info(f"工作进程 {worker_id} 认领{len(batch_df)}条记录")
+                return {'batch': json.loads(batch_df.to_json(orient='split', index=False)),
+                        'pending': None, 'retry_after': 0}
+
+            cur = p.conn.cursor()
+            cur.execute(
+                f"SELECT COUNT(*), MIN({p.lease_field}) FROM {p.table_name} WHERE {p._pending_condition()}"
+            )
+            pending, earliest_expiry = cur.fetchone()
+        retry_after = max(0.0, (earliest_expiry or time.time()) - time.time())
+        return {'batch': None, 'pending': pending, 'retry_after': retry_after}
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        写入工作进程发回的回填记录(只写仍由该工作进程持有租约的记录)
+
+        回填记录按 body['fields'] 的字段顺序排列，两端 retry_sweeps 等设置不同时按字段名转换为本端的格式
+        """
+        updates = self._align_updates(body.get('fields'), body['updates'])
+        with self._lock:
+            self.processor._batch_update(updates, worker_id=body['worker_id'])
+        return {'written': len(updates)}
+
+    def _align_updates(self, fields: Optional[List[str]], updates: List[List]) -> List[List]:
+        """
+        把工作进程的回填记录转换为本端 _get_update_fields + 游标ID 的顺序
+
+        工作进程没有下次尝试时间字段时，成功的记录置空，失败的记录按本端的退避设置安排
+        """
+        p = self.processor
+        target = p._get_update_fields() + [p.cursor_field]
+        if fields is None or list(fields) == target:
+            if updates and len(updates[0]) != len(target):
+                raise ValueError(f"回填记录有{len(updates[0])}个字段，协调服务需要{len(target)}个: {target}")
+            return updates
+
+        index = {field: i for i, field in enumerate(fields)}
+        missing = [field for field in target if field not in index and field != p.next_attempt_field]
+        if missing:
+            raise ValueError(f"回填记录缺少字段 {missing}，请确认工作进程与协调服务的 define_schema 一致")
+
+        status, retry = index[p.status_field], index[p.retry_field]
+        aligned = []
+        for record in updates:
+            row = []
+            for field in target:
+                if field in index:
+                    row.append(record[index[field]])
+                elif record[status]:
+                    row.append(None)
+                else:
+                    row.append(time.time() + p._retry_delay(int(record[retry])))
+            aligned.append(row)
+        return aligned
+
+    def fail(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        工作进程整批处理失败: 这些记录重试次数加1，保留租约直到到期后再重新分发
+        """
+        p = self.processor
+        cursor_ids = [int(i) for i in body['cursor_ids']]
+        self.logger.error(f"工作进程 {body['worker_id']} 处理{len(cursor_ids)}条记录失败: {body.get('error')}")
+        with self._lock:
+            cur = p.conn.cursor()
+            cur.executemany(
+                f"UPDATE {p.table_name} SET {p.retry_field} = {p.retry_field} + 1 "
+                f"WHERE {p.cursor_field} = ? AND {p.claimed_by_field} = ?",
+                [(cursor_id, body['worker_id']) for cursor_id in cursor_ids]
+            )
+            p.conn.commit()
+        return {'failed': len(cursor_ids)}
+
+    def statistics(self) -> Dict[str, int]:
+        with self._lock:
+            stats = self.processor.get_statistics()
+        return {k: int(v or 0) for k, v in stats.items()}
+
+    def serve_forever(self):
+        """在当前线程中运行服务，直到 shutdown()"""
+        self.logger.info(f"协调服务已启动，端口 {self.port}")
+        self.server.serve_forever()
+
+    def start(self) -> 'BatchCoordinator':
+        """在后台线程中运行服务(适用于Jupyter)"""
+        self._thread = threading.Thread(target=self.serve_forever, name='batch-coordinator', daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class RemoteWorker:
+    """
+    远程工作进程: 从协调服务领取批次，在本地执行业务逻辑并发回结果
+    """
+
+    def __init__(self, processor: BatchProcessor, coordinator_url: str,
+                 worker_id: Optional[str] = None, timeout: float = 60):
+        """
+        Args:
+            processor: 业务处理器，只使用其 define_schema / process_business_logic
+            coordinator_url: 协调服务地址，如 http://host:8765
+            worker_id: 工作进程标识，默认使用 processor.worker_id(主机名-进程号)
+            timeout: HTTP请求超时(秒)
+        """
+        self.processor = processor
+        self.url = coordinator_url.rstrip('/')
+        self.worker_id = worker_id or processor.worker_id
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.logger = logging.getLogger(__name__)
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.post(f"{self.url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def run(self, max_batches: Optional[int] = None) -> int:
+        """
+        持续领取并处理批次，直到没有待处理记录
+
+        所有剩余记录都被其他进程持有租约时，等待到最早的租约到期再尝试，
+        以便接手中断的工作进程遗留的记录。
+
+        Args:
+            max_batches: 最多处理的批次数，None表示不限制
+
+        Returns:
+            回填的记录数
+        """
+        total = 0
+        batch_count = 0
+        while max_batches is None or batch_count < max_batches:
+            lease = self._post('/lease', {'worker_id': self.worker_id})
+            if lease['batch'] is None:
+                if not lease['pending']:
+                    break
+                time.sleep(min(max(lease['retry_after'], 0.1), 5))
+                continue
+
+            batch = lease['batch']
+            batch_df = pd.DataFrame(batch['data'], columns=batch['columns'])
+            batch_count += 1
+            try:
+                updates = self.processor._build_updates(batch_df)
+            except Exception as e:
+                cursor_ids = batch_df[self.processor.cursor_field].tolist()
+                self._post('/fail', {'worker_id': self.worker_id, 'cursor_ids': cursor_ids, 'error': str(e)})
+                continue
+
+            self._post('/complete', {'worker_id': self.worker_id, 'updates': updates,
+                                     'fields': self.processor._get_update_fields() + [self.processor.cursor_field]})
+            total += len(updates)
+            self.logger.info(f"工作进程 {self.worker_id} 已处理{total}条数据")
+
+        return total
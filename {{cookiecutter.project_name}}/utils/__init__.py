@@ -1,9 +1,10 @@
 """Utility helpers for the batch processor project."""
 
+from .cache import KeyedBatchCache
 from .parallel import parallel, join_all
 
 __all__ = [
     "parallel",
     "join_all",
+    "KeyedBatchCache",
 ]
-
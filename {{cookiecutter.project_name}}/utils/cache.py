@@ -0,0 +1,93 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Optional
+
+from cachetools import LRUCache, TTLCache
+
+
+class KeyedBatchCache:
+    """Per-key cache for bulk lookups.
+
+    Caching a bulk fetch on the whole tuple of keys only hits when the exact
+    same batch repeats. This cache stores every fetched value under its own
+    key instead, so each batch is split into cache hits and misses and only
+    the misses are sent to the bulk fetcher.
+
+    Usage:
+        order_cache = KeyedBatchCache(maxsize=100_000, ttl=3600)
+
+        def fetch_orders(order_ids):
+            # one bulk API call, returns {order_id: order_info}
+            ...
+
+        orders = order_cache.get_many(batch_data['order_id'], fetch_orders)
+        order_cache.hit_ratio  # e.g. 0.83
+
+    Safe to share between threads. Two threads missing the same key at the
+    same time may both fetch it.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize: maximum number of cached keys; least recently used keys are evicted first
+            ttl: seconds a value stays valid after it was fetched, None means no expiry
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl) if ttl else LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[Hashable],
+                 fetch_fn: Callable[[List[Hashable]], Mapping[Hashable, Any]]) -> Dict[Hashable, Any]:
+        """Look up ``keys``, fetching only the ones not in the cache.
+
+        ``fetch_fn`` is called at most once, with the list of distinct missing
+        keys, and must return a mapping from key to value. Keys it leaves out
+        are not cached and are simply absent from the result.
+
+        Returns:
+            dict of key -> value for every requested key that has a value
+        """
+        result = {}
+        missing = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                try:
+                    result[key] = self._cache[key]
+                except KeyError:
+                    missing.append(key)
+            self.hits += len(result)
+            self.misses += len(missing)
+
+        if missing:
+            fetched = fetch_fn(missing) or {}
+            with self._lock:
+                for key in missing:
+                    if key in fetched:
+                        self._cache[key] = result[key] = fetched[key]
+        return result
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._cache)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "size": size,
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self, reset_stats: bool = False):
+        with self._lock:
+            self._cache.clear()
+            if reset_stats:
+                self.hits = 0
+                self.misses = 0